@@ -1,7 +1,9 @@
 from flask import Flask, request
+from pitfalls_core.metrics import Metrics
 import os
 
 app = Flask(__name__)
+Metrics(app)
 
 
 @app.route("/")
@@ -21,5 +23,9 @@ def get_flag():
     return os.environ.get("FLAG", "pitfalls{fake_flag}")
 
 
+def create_app():
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=False, host="0.0.0.0", port=8080)
+    create_app().run(debug=False, host="0.0.0.0", port=8080)
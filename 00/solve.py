@@ -1,9 +1,14 @@
-import requests
+# /// script
+# dependencies = ["httpx"]
+# ///
+
+import os
 import sys
-ipsocket = "172.24.0.2:8080"
-#ipsocket = sys.argv[1]
-url = f"http://{ipsocket}/get-flag"
-params = {"seriously": "true"}
-data = {"please": "pretty please"}
-response = requests.post(url, params=params,data=data)
-print(response.text)
\ No newline at end of file
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "serving")
+)
+from exploits import solve, solve_00  # noqa: E402
+
+# python solve.py <host:port>
+solve(solve_00, sys.argv[1])
@@ -3,19 +3,37 @@ import uuid
 import time
 import shutil
 from flask import Flask, render_template, request, redirect, url_for, session
-from flask.templating import render_template_string
 from werkzeug.utils import secure_filename
-import requests
 import hashlib
 import threading
+from collections import OrderedDict
+from pitfalls_core.caching import conditional
+from pitfalls_core.compression import Compression
+from pitfalls_core.health import Health, filesystem_probe
+from pitfalls_core.metrics import Metrics
+from pitfalls_core.ratelimit import RateLimiter
+from pitfalls_core.templates import TemplateCache
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-key-change-in-production')
 app.config['SESSION_FOLDER'] = 'sessions'
 app.config['SESSION_TIMEOUT'] = 86400  # 24 hours in seconds
+# Cache-Control per endpoint for conditionally served pages
+app.config['CACHE_CONTROL'] = {
+    'note': 'private, no-cache',
+}
+# Rate limit policy per endpoint (see RateLimiter)
+app.config['RATELIMIT_ROUTES'] = {
+    'create': 'write',
+}
+Metrics(app)
+Compression(app)
+TemplateCache(app)
+RateLimiter(app)
 
 # Ensure sessions directory exists
 os.makedirs(app.config['SESSION_FOLDER'], exist_ok=True)
+Health(app).probe('sessions', filesystem_probe(app.config['SESSION_FOLDER']))
 
 def get_session_id():
     if 'session_id' not in session:
@@ -87,6 +105,13 @@ def get_note(filename):
     except Exception:
         return None
 
+def note_etag(filename):
+    try:
+        st = os.stat(os.path.join(get_session_folder(), filename))
+    except OSError:
+        return None
+    return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
 @app.route('/')
 def index():
     notes = get_notes()
@@ -94,11 +119,14 @@ def index():
 
 @app.route('/note/<path:filename>')
 def note(filename):
-    note_content = get_note(filename)
-    if note_content:
-        return render_template('note.html', note=note_content)
-    else:
-        return "Note not found", 404
+    def render():
+        note_content = get_note(filename)
+        if note_content:
+            return render_template('note.html', note=note_content)
+        else:
+            return "Note not found", 404
+
+    return conditional(note_etag(filename), render)
 
 @app.route('/create', methods=['GET', 'POST'])
 def create():
@@ -122,36 +150,96 @@ Author: {author}
         return redirect(url_for('index'))
     return render_template('create.html')
 
+EXPECTED_NOTE_SHA256 = "e17db96b0c37d98550eaef20f7370363636f20ad7944d92235ca9e0cd1221629"
+DEFAULT_NOTE = 'My_Family_Tea_Recipe.txt'
+
+# Set SELF_CHECK_URL to run the checks over real HTTP instead of in-process
+SELF_CHECK_URL = os.environ.get('SELF_CHECK_URL')
+http_session = None
+if SELF_CHECK_URL:
+    # requests is only loaded when the checks go over HTTP
+    import requests
+    http_session = requests.Session()
+
+# Pages of the check routes, compiled once rather than on every request
+CHECK_PAGES = {
+    'unavailable': app.jinja_env.from_string("Page not available :("),
+    'integrity_broken': app.jinja_env.from_string("Integrity compromised! Here is your integrity flag: {{flag}}"),
+    'integrity_intact': app.jinja_env.from_string("Integrity intact!"),
+    'availability_broken': app.jinja_env.from_string("Availability compromised! Here is your availability flag: {{flag}}"),
+    'availability_intact': app.jinja_env.from_string("Availability intact!"),
+}
+
+# (note path, mtime, size) -> sha256 of the rendered note page. Every session
+# and every edit adds a key, so only the most recently used are kept
+NOTE_DIGESTS_MAX = 1024
+note_digests = OrderedDict()
+note_digests_lock = threading.Lock()
+
+"""Fetch a page of this app with the caller's session, returns (status, body)"""
+def self_get(path):
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    cookie = request.cookies.get(cookie_name)
+    if http_session is not None:
+        res = http_session.get(SELF_CHECK_URL + path, cookies={cookie_name: cookie})
+        return res.status_code, res.content
+
+    client = app.test_client()
+    if cookie:
+        client.set_cookie(cookie_name, cookie)
+    res = client.get(path)
+    return res.status_code, res.get_data()
+
+def default_note_digest():
+    note_path = os.path.join(get_session_folder(), DEFAULT_NOTE)
+    try:
+        st = os.stat(note_path)
+        key = (note_path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+
+    with note_digests_lock:
+        if key in note_digests:
+            note_digests.move_to_end(key)
+            return note_digests[key]
+
+    status, body = self_get(f"/note/{DEFAULT_NOTE}")
+    if status != 200:
+        return None
+    digest = hashlib.sha256(body).hexdigest()
+    if key is not None:
+        with note_digests_lock:
+            note_digests[key] = digest
+            note_digests.move_to_end(key)
+            if len(note_digests) > NOTE_DIGESTS_MAX:
+                note_digests.popitem(last=False)
+    return digest
+
 @app.route('/check_broken_integrity')
 def check_broken_integrity():
     get_session_id()
-    session_data = {app.config['SESSION_COOKIE_NAME']: request.cookies.get(app.config['SESSION_COOKIE_NAME'])}
+    digest = default_note_digest()
 
-    res = requests.get("http://127.0.0.1:8080/note/My_Family_Tea_Recipe.txt",
-                      cookies=session_data)
+    if digest is None:
+        return render_template(CHECK_PAGES['unavailable'])
 
-    if res.status_code != 200:
-        return render_template_string("Page not available :(")
-
-    if "e17db96b0c37d98550eaef20f7370363636f20ad7944d92235ca9e0cd1221629" != hashlib.sha256(res.text.encode()).hexdigest():
-        return render_template_string(
-                    "Integrity compromised! Here is your integrity flag: {{flag}}",
+    if EXPECTED_NOTE_SHA256 != digest:
+        return render_template(
+                    CHECK_PAGES['integrity_broken'],
                     flag=os.environ.get("FLAG_I", "pitfalls{fake_flag}"),
                 )
-    return render_template_string("Integrity intact!")
+    return render_template(CHECK_PAGES['integrity_intact'])
 
 @app.route('/check_broken_availability')
 def check_broken_availability():
     get_session_id()
-    session_data = {app.config['SESSION_COOKIE_NAME']: request.cookies.get(app.config['SESSION_COOKIE_NAME'])}
-    res = requests.get("http://127.0.0.1:8080/",
-                      cookies=session_data)
-    if res.status_code != 200:
-        return render_template_string(
-                    "Availability compromised! Here is your availability flag: {{flag}}",
+    status, _ = self_get("/")
+    if status != 200:
+        return render_template(
+                    CHECK_PAGES['availability_broken'],
                     flag=os.environ.get("FLAG_A", "pitfalls{fake_flag}"),
                 )
-    return render_template_string("Availability intact!")
+    return render_template(CHECK_PAGES['availability_intact'])
 
 @app.route('/reset')
 def new_session():
@@ -162,11 +250,16 @@ def new_session():
 def health():
     return "OK"
 
+def create_app():
+    app.extensions['templates'].warm()
+    if os.path.exists("/confidential.txt"):
+        with open("/confidential.txt", "r+") as confidential_file:
+            confidential_content = confidential_file.read()
+            confidential_content = confidential_content.replace("pitfalls{fake_flag}", os.environ.get("FLAG_C", "pitfalls{fake_flag}"))
+            confidential_file.seek(0)
+            confidential_file.write(confidential_content)
+            confidential_file.truncate()
+    return app
+
 if __name__ == '__main__':
-    with open("/confidential.txt", "r+") as confidential_file:
-        confidential_content = confidential_file.read()
-        confidential_content = confidential_content.replace("pitfalls{fake_flag}", os.environ.get("FLAG_C", "pitfalls{fake_flag}"))
-        confidential_file.seek(0)
-        confidential_file.write(confidential_content)
-        confidential_file.truncate()
-    app.run(debug=False, host='0.0.0.0', port=8080)
+    create_app().run(debug=False, host='0.0.0.0', port=8080)
@@ -1,17 +1,33 @@
+import base64
+import functools
 import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
 from flask import Flask, render_template, request, redirect, url_for, flash
 from sqlalchemy import Column, String, Text
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import declarative_base
-from Cryptodome.Cipher import AES
 from Cryptodome.Util.Padding import pad, unpad
 from Cryptodome.Random import get_random_bytes
 import hmac
 import json
 import hashlib
-from argon2 import PasswordHasher
+from pitfalls_core.compression import Compression
+from pitfalls_core.health import Health, sqlite_probe
+from pitfalls_core.metrics import Metrics
+from pitfalls_core.ratelimit import RateLimiter
+from pitfalls_core.templates import TemplateCache
+
+
+@functools.cache
+def password_hasher():
+    # argon2 is only needed when a course is created or logged into
+    from argon2 import PasswordHasher
+
+    return PasswordHasher()
 
-ph = PasswordHasher()
 
 app = Flask(__name__)
 # app.secret_key = (
@@ -22,6 +38,17 @@ app = Flask(__name__)
 app.secret_key = b"ABCdef123#@!XYZabc456$%^7890QWER"
 
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+# Flask-SQLAlchemy gives an in-memory database one connection shared by all
+# threads; autocommit keeps one request's commit from ending another's
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {"isolation_level": "AUTOCOMMIT"}
+app.config["COOKIE_CACHE_SIZE"] = 4096
+app.config["COOKIE_CACHE_TTL"] = 300.0
+# Rate limit policy per endpoint (see RateLimiter)
+app.config["RATELIMIT_ROUTES"] = {"create": "write", "login": "auth"}
+Metrics(app)
+Compression(app)
+TemplateCache(app)
+RateLimiter(app)
 Base = declarative_base()
 
 
@@ -36,15 +63,81 @@ class Course(Base):
 
 db = SQLAlchemy(model_class=Base)
 db.init_app(app)
+Health(app).probe("sqlite", sqlite_probe(app, db))
+
+
+class CourseRecord(NamedTuple):
+    code: str
+    name: str
+    sylabus: str
+    password: str
+    private_note: str
+
+    @classmethod
+    def from_row(cls, course: Course):
+        return cls(
+            course.code,
+            course.name,
+            course.sylabus,
+            course.password,
+            course.private_note,
+        )
+
+
+class CourseCatalogue:
+    """
+    Read-mostly in-memory copy of the courses table.
+
+    Readers use the current snapshot without locking; writers build a new
+    snapshot under a lock and swap it in, so a listing is never torn.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._courses = ()
+        self._by_code = {}
+
+    def load(self):
+        with self._lock:
+            courses = tuple(
+                CourseRecord.from_row(c) for c in db.session.query(Course).all()
+            )
+            self._courses, self._by_code = courses, {c.code: c for c in courses}
+
+    def add(self, course: CourseRecord):
+        with self._lock:
+            courses = self._courses + (course,)
+            by_code = dict(self._by_code)
+            by_code[course.code] = course
+            self._courses, self._by_code = courses, by_code
+
+    def get(self, code: str) -> CourseRecord | None:
+        return self._by_code.get(code)
+
+    def all(self) -> tuple[CourseRecord, ...]:
+        return self._courses
+
+
+catalogue = CourseCatalogue()
 
 
 def get_course_by_code(course_code: str):
-    return db.session.query(Course).filter(Course.code == course_code).first()
+    return catalogue.get(course_code)
+
 
+# Stored instead of a hash for the seeded courses. Their random password is
+# never shown to anyone, so nothing could match it; argon2 rejects this marker
+# the same way and startup skips hashing five passwords.
+UNUSABLE_PASSWORD = "!"
 
-def create_course(code: str, name: str, sylabus: str, private_note: str):
-    password = os.urandom(8).hex()
-    hashed_password = ph.hash(password.strip())
+
+def create_course(
+    code: str, name: str, sylabus: str, private_note: str, with_password=True
+):
+    password = os.urandom(8).hex() if with_password else None
+    hashed_password = (
+        password_hasher().hash(password.strip()) if with_password else UNUSABLE_PASSWORD
+    )
     db_course = Course(
         code=code,
         name=name.strip(),
@@ -55,77 +148,192 @@ def create_course(code: str, name: str, sylabus: str, private_note: str):
     db.session.add(db_course)
     db.session.commit()
     db.session.refresh(db_course)
+    catalogue.add(CourseRecord.from_row(db_course))
     return db_course, password
 
 
 def get_courses():
-    return db.session.query(Course).all()
+    return catalogue.all()
 
 
 with app.app_context():
     db.create_all()
+    catalogue.load()
     if not get_courses():
         _, _ = create_course(
             "NMAI057",
             "Linear Algebra 1",
             "Basics of linear algebra (vector spaces and linear maps, solutions of linear equations, matrices).",
             "Everything is just linear transformation.",
+            with_password=False,
         )
         _, _ = create_course(
             "NTIN060",
             "Algorithms and Data Structures 1",
             "Introductory lecture on the basic types of algorithms and data structures necessary for their implementation.",
             "The universe runs in O(1).",
+            with_password=False,
         )
         _, _ = create_course(
             "NTIN061",
             "Algorithms and Data Structures 2",
             "Lecture about various types of algorithms and their time complexity (follows NTIN060 Algorithms and data structures 1).",
             "P != NP",
+            with_password=False,
         )
         _, _ = create_course(
             "NAIL025",
             "Evolutionary Algorithms 1",
             "Models of evolution, genetic algorithms, representation and operators of selection, mutation and crossover.",
             "Strongest survive.",
+            with_password=False,
         )
         _, _ = create_course(
             "NSWI205",
             "Pitfalls of computer security",
             "An introductory course on computer security. It presents basic types of attacks on security of computer systems and applications, along with counter-measures against them.",
             os.environ.get("FLAG", "pitfalls{fake_flag}"),
+            with_password=False,
         )
 
 
+class VerifiedCookieCache:
+    """
+    Bounded LRU from a cookie digest to the courseid it was verified to hold.
+    Entries expire after `ttl` seconds; clear() drops everything, including
+    entries still being verified under the previous key.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(cookie: str) -> bytes:
+        return hashlib.blake2b(cookie.encode(), digest_size=16).digest()
+
+    def get(self, digest: bytes) -> str | None:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                return None
+            courseid, expires = entry
+            if expires < time.monotonic():
+                del self._entries[digest]
+                return None
+            self._entries.move_to_end(digest)
+            return courseid
+
+    def put(self, digest: bytes, courseid: str, generation: int):
+        with self._lock:
+            if generation != self.generation or self.maxsize <= 0:
+                return
+            self._entries[digest] = (courseid, time.monotonic() + self.ttl)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+class CookieCodec:
+    """
+    AES-CBC session cookie codec.
+
+    The keyed HMAC state is built once, so each cookie only pays for its
+    own blocks. Cookies are base64url encoded `iv || ciphertext || mac`
+    with the MAC taken over the ciphertext. Successfully verified cookies
+    are remembered, so repeated views of the same cookie skip AES and HMAC
+    until the entry expires or the key rotates.
+    """
+
+    block_size = 16
+    mac_size = hashlib.sha256().digest_size
+    # iv + one block + mac, base64url without padding
+    min_length = -(-(2 * block_size + mac_size) * 4 // 3)
+    max_length = 4096
+
+    def __init__(self, key: bytes, cache_size: int = 4096, cache_ttl: float = 300.0):
+        self.cache = VerifiedCookieCache(cache_size, cache_ttl)
+        self.rotate(key)
+
+    def rotate(self, key: bytes):
+        # Cryptodome's AES is loaded with the first codec, not with the app
+        from Cryptodome.Cipher import AES
+
+        self._cipher = functools.partial(AES.new, key, AES.MODE_CBC)
+        self._mac = hmac.new(key, digestmod=hashlib.sha256)
+        self.cache.clear()
+
+    def _sign(self, data: bytes) -> bytes:
+        mac = self._mac.copy()
+        mac.update(data)
+        return mac.digest()
+
+    def encode(self, course_code: str) -> str:
+        payload = json.dumps({"courseid": course_code.strip()}).encode()
+        iv = get_random_bytes(self.block_size)
+        encrypted_data = self._cipher(iv).encrypt(pad(payload, self.block_size))
+        raw = iv + encrypted_data + self._sign(encrypted_data)
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+    def decode(self, cookie: str) -> str | None:
+        if not self.min_length <= len(cookie) <= self.max_length:
+            return None
+        digest = self.cache.digest(cookie)
+        courseid = self.cache.get(digest)
+        if courseid is not None:
+            return courseid
+        generation = self.cache.generation
+        courseid = self._verify(cookie)
+        if courseid is not None:
+            self.cache.put(digest, courseid, generation)
+        return courseid
+
+    def _verify(self, cookie: str) -> str | None:
+        try:
+            raw = base64.urlsafe_b64decode(cookie + "=" * (-len(cookie) % 4))
+            data_size = len(raw) - self.block_size - self.mac_size
+            if data_size <= 0 or data_size % self.block_size:
+                return None
+            iv = raw[: self.block_size]
+            encrypted_data = raw[self.block_size : -self.mac_size]
+            if not hmac.compare_digest(
+                raw[-self.mac_size :], self._sign(encrypted_data)
+            ):
+                return None
+            decrypted_data = unpad(
+                self._cipher(iv).decrypt(encrypted_data), self.block_size
+            )
+            cookie_obj = json.loads(decrypted_data.decode().strip())
+            if not "courseid" in cookie_obj:
+                return None
+            return cookie_obj["courseid"]
+        except (ValueError, IndexError, json.JSONDecodeError):
+            return None
+
+
+@functools.cache
+def get_cookie_codec() -> CookieCodec:
+    return CookieCodec(
+        app.secret_key,
+        cache_size=app.config["COOKIE_CACHE_SIZE"],
+        cache_ttl=app.config["COOKIE_CACHE_TTL"],
+    )
+
+
 def encrypt_cookie(course_code: str) -> str:
-    cookie_obj = {"courseid": course_code.strip()}
-    payload = json.dumps(cookie_obj)
-    iv = get_random_bytes(AES.block_size)
-    cipher = AES.new(app.secret_key, AES.MODE_CBC, iv)
-    padded_data = pad(payload.encode(), AES.block_size)
-    encrypted_data = cipher.encrypt(padded_data)
-    mac = hmac.new(app.secret_key, encrypted_data, hashlib.sha256).hexdigest()
-    return iv.hex() + encrypted_data.hex() + mac
+    return get_cookie_codec().encode(course_code)
 
 
 def decrypt_cookie(cookie: str) -> str | None:
-    try:
-        iv = bytes.fromhex(cookie[:32])
-        encrypted_data = bytes.fromhex(cookie[32:-64])
-        mac = cookie[-64:]
-        expected_mac = hmac.new(
-            app.secret_key, encrypted_data, hashlib.sha256
-        ).hexdigest()
-        if not hmac.compare_digest(mac, expected_mac):
-            return None
-        cipher = AES.new(app.secret_key, AES.MODE_CBC, iv)
-        decrypted_data = unpad(cipher.decrypt(encrypted_data), AES.block_size)
-        cookie_obj = json.loads(decrypted_data.decode().strip())
-        if not "courseid" in cookie_obj:
-            return None
-        return cookie_obj["courseid"]
-    except (ValueError, IndexError, json.JSONDecodeError):
-        return None
+    return get_cookie_codec().decode(cookie)
 
 
 @app.route("/")
@@ -179,7 +387,7 @@ def login(course_code: str):
     if request.method == "POST":
         password = request.form["password"].strip()
         try:
-            _ = ph.verify(str(course.password), password)
+            _ = password_hasher().verify(str(course.password), password)
         except Exception:
             flash("Invalid password", "danger")
             return render_template("login.html", course=course)
@@ -187,7 +395,7 @@ def login(course_code: str):
         resp = redirect(url_for("course", course_code=course_code))
         resp.set_cookie("session", encrypt_cookie(course_code))
         return resp
-    
+
     return render_template("login.html", course=course)
 
 
@@ -196,5 +404,10 @@ def health():
     return "OK"
 
 
+def create_app():
+    app.extensions["templates"].warm()
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=False, host="0.0.0.0", port=8080)
+    create_app().run(debug=False, host="0.0.0.0", port=8080)
@@ -0,0 +1,79 @@
+import hashlib
+import hmac
+import json
+import sys
+import time
+
+from Cryptodome.Cipher import AES
+from Cryptodome.Random import get_random_bytes
+from Cryptodome.Util.Padding import pad, unpad
+
+import app as course_app
+
+# Number of cookies per measurement, override with the first argument
+N = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+KEY = course_app.app.secret_key
+
+
+## per-call cipher and hex encoding, as the cookies were handled before
+def legacy_encrypt(course_code):
+    payload = json.dumps({"courseid": course_code.strip()})
+    iv = get_random_bytes(AES.block_size)
+    cipher = AES.new(KEY, AES.MODE_CBC, iv)
+    encrypted_data = cipher.encrypt(pad(payload.encode(), AES.block_size))
+    mac = hmac.new(KEY, encrypted_data, hashlib.sha256).hexdigest()
+    return iv.hex() + encrypted_data.hex() + mac
+
+
+def legacy_decrypt(cookie):
+    iv = bytes.fromhex(cookie[:32])
+    encrypted_data = bytes.fromhex(cookie[32:-64])
+    expected_mac = hmac.new(KEY, encrypted_data, hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(cookie[-64:], expected_mac):
+        return None
+    cipher = AES.new(KEY, AES.MODE_CBC, iv)
+    return json.loads(unpad(cipher.decrypt(encrypted_data), AES.block_size))["courseid"]
+
+
+def rate(fn, arg):
+    start = time.perf_counter()
+    for _ in range(N):
+        fn(arg)
+    return N / (time.perf_counter() - start)
+
+
+def report(name, encode, decode):
+    cookie = encode("NSWI205")
+    assert decode(cookie) == "NSWI205"
+    print(f"{name:8} encode {rate(encode, 'NSWI205'):>10,.0f} cookies/s"
+          f"   decode {rate(decode, cookie):>10,.0f} cookies/s")
+
+
+uncached = course_app.CookieCodec(KEY, cache_size=0)
+
+report("legacy", legacy_encrypt, legacy_decrypt)
+report("codec", uncached.encode, uncached.decode)
+report("cached", course_app.encrypt_cookie, course_app.decrypt_cookie)
+
+# Malformed cookies are rejected before any crypto work
+print(f"{'reject':8} decode {rate(course_app.decrypt_cookie, 'x' * 10):>10,.0f} cookies/s")
+
+
+## requests/s on the course listing, with the ORM query and with the catalogue
+def orm_courses():
+    return course_app.db.session.query(course_app.Course).all()
+
+
+def index_rate(requests):
+    client = course_app.app.test_client()
+    start = time.perf_counter()
+    for _ in range(requests):
+        assert client.get("/").status_code == 200
+    return requests / (time.perf_counter() - start)
+
+
+catalogue_courses = course_app.get_courses
+course_app.get_courses = orm_courses
+print(f"{'orm':8} GET /  {index_rate(N // 10):>10,.0f} requests/s")
+course_app.get_courses = catalogue_courses
+print(f"{'memory':8} GET /  {index_rate(N // 10):>10,.0f} requests/s")
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+
+import pytest
+from Cryptodome.Cipher import AES
+from Cryptodome.Util.Padding import pad, unpad
+
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+
+import app as courses  # noqa: E402
+from app import CookieCodec  # noqa: E402
+
+KEY = b"0123456789abcdef0123456789abcdef"
+IV = bytes(range(16))
+
+
+def b64decode(cookie):
+    return base64.urlsafe_b64decode(cookie + "=" * (-len(cookie) % 4))
+
+
+def b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def reference_cookie(course_code, iv=IV, key=KEY):
+    """The wire format, built step by step: iv || CBC(json) || HMAC(ciphertext)."""
+    payload = json.dumps({"courseid": course_code}).encode()
+    encrypted = AES.new(key, AES.MODE_CBC, iv).encrypt(pad(payload, 16))
+    return b64encode(iv + encrypted + hmac.digest(key, encrypted, hashlib.sha256))
+
+
+@pytest.fixture
+def codec(monkeypatch):
+    monkeypatch.setattr(courses, "get_random_bytes", lambda n: IV[:n])
+    return CookieCodec(KEY, cache_size=0)
+
+
+@pytest.mark.parametrize("code", ["NSWI205", "QSWI205", "A" * 40, 'we"ird\\', "ž"])
+def test_encode_matches_the_wire_format(codec, code):
+    assert codec.encode(code) == reference_cookie(code)
+    assert codec.decode(codec.encode(code)) == code
+
+
+def test_decode_accepts_the_wire_format(codec):
+    cookie = reference_cookie("NMAI057", iv=os.urandom(16))
+
+    assert codec.decode(cookie) == "NMAI057"
+
+
+def test_iv_bit_flip_changes_the_first_block(codec):
+    # The MAC leaves the IV out, so flipping a bit of it flips the same bit
+    # of the first plaintext block: the Q of {"courseid": "QSWI205"}
+    raw = bytearray(b64decode(codec.encode("QSWI205")))
+    raw[14] ^= ord("Q") ^ ord("N")
+
+    assert codec.decode(b64encode(bytes(raw))) == "NSWI205"
+
+
+@pytest.mark.parametrize("offset", [16, -1])
+def test_tampered_ciphertext_or_mac_is_rejected(codec, offset):
+    raw = bytearray(b64decode(codec.encode("NSWI205")))
+    raw[offset] ^= 1
+
+    assert codec.decode(b64encode(bytes(raw))) is None
+
+
+@pytest.mark.parametrize(
+    "cookie",
+    ["", "x" * 20, "!" * 80, b64encode(os.urandom(64)), b64encode(os.urandom(65))],
+)
+def test_malformed_cookies_are_rejected(codec, cookie):
+    assert codec.decode(cookie) is None
+
+
+def test_cookie_without_courseid_is_rejected(codec):
+    payload = pad(json.dumps({"course": "NSWI205"}).encode(), 16)
+    encrypted = AES.new(KEY, AES.MODE_CBC, IV).encrypt(payload)
+    cookie = b64encode(IV + encrypted + hmac.digest(KEY, encrypted, hashlib.sha256))
+
+    assert codec.decode(cookie) is None
+
+
+def test_rotate_invalidates_cookies_and_cache():
+    codec = CookieCodec(KEY)
+    cookie = codec.encode("NSWI205")
+    assert codec.decode(cookie) == "NSWI205"
+
+    codec.rotate(b"f" * 32)
+    assert codec.decode(cookie) is None
+
+
+def test_course_page_trusts_the_flipped_cookie():
+    client = courses.create_app().test_client()
+    response = client.post(
+        "/create",
+        data={"code": "QSWI205", "name": "n", "sylabus": "s", "private_note": "p"},
+        follow_redirects=True,
+    )
+    password = re.search(r"Your password is: (.*)<", response.text).group(1)
+    client.post("/login/QSWI205", data={"password": password})
+
+    raw = bytearray(b64decode(client.get_cookie("session").value))
+    raw[14] ^= ord("Q") ^ ord("N")
+    client.set_cookie("session", b64encode(bytes(raw)))
+
+    flag = os.environ.get("FLAG", "pitfalls{fake_flag}")
+    assert flag in client.get("/course/NSWI205").text
+    # The plaintext really is the target's, decrypted with the app's key
+    raw = b64decode(client.get_cookie("session").value)
+    cipher = AES.new(courses.app.secret_key, AES.MODE_CBC, raw[:16])
+    assert json.loads(unpad(cipher.decrypt(raw[16:-32]), 16)) == {"courseid": "NSWI205"}
@@ -0,0 +1,49 @@
+import os
+import re
+
+import pytest
+
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+
+import app as courses  # noqa: E402
+from app import UNUSABLE_PASSWORD, Course, db  # noqa: E402
+
+SEEDED = ["NMAI057", "NTIN060", "NTIN061", "NAIL025", "NSWI205"]
+
+
+@pytest.fixture
+def client():
+    return courses.create_app().test_client()
+
+
+def test_seeded_courses_store_the_unusable_marker():
+    with courses.app.app_context():
+        stored = {c.code: c.password for c in db.session.query(Course).all()}
+
+    assert {code: stored[code] for code in SEEDED} == dict.fromkeys(
+        SEEDED, UNUSABLE_PASSWORD
+    )
+
+
+@pytest.mark.parametrize("code", SEEDED)
+@pytest.mark.parametrize("password", ["", UNUSABLE_PASSWORD, "0123456789abcdef"])
+def test_seeded_courses_reject_every_password(client, code, password):
+    response = client.post(f"/login/{code}", data={"password": password})
+
+    assert response.status_code == 200
+    assert "Invalid password" in response.text
+    assert client.get_cookie("session") is None
+
+
+def test_created_course_accepts_its_password(client):
+    response = client.post(
+        "/create",
+        data={"code": "LOGIN01", "name": "n", "sylabus": "s", "private_note": "p"},
+        follow_redirects=True,
+    )
+    password = re.search(r"Your password is: (.*)<", response.text).group(1)
+
+    assert client.post("/login/LOGIN01", data={"password": "x"}).status_code == 200
+    response = client.post("/login/LOGIN01", data={"password": password})
+    assert response.status_code == 302
+    assert client.get_cookie("session") is not None
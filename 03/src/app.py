@@ -1,9 +1,10 @@
+import importlib.util
 import os
 import re
 from datetime import datetime
 
+import pitfalls_core
 from flask import (
-    Flask,
     render_template,
     request,
     redirect,
@@ -12,38 +13,43 @@ from flask import (
     session,
     abort,
 )
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
-from sqlalchemy.pool import StaticPool
-from argon2 import PasswordHasher
+from pitfalls_core import (
+    ReportQueue,
+    UserMixin,
+    conditional,
+    db,
+    filesystem_probe,
+    get_current_user,
+    init_db,
+    redis_probe,
+    require_admin,
+)
+from sqlalchemy import Column, DateTime, Integer, String, Text
 
-try:
-    from redis import Redis
-    from rq import Queue
+# ------------------------------------------------------------
+# Admin review queue
+# ------------------------------------------------------------
 
-    redis_conn = Redis(host="redis", port=6379)
-    report_queue = Queue("default", connection=redis_conn)
-    RQ_ENABLED = True
-except Exception:
-    RQ_ENABLED = False
+RQ_ENABLED = importlib.util.find_spec("rq") is not None
+report_queue = ReportQueue(
+    os.environ.get("REPORT_QUEUE_LOG", "report_queue.log"),
+    os.environ.get("REDIS_URL", "redis://redis:6379"),
+)
 
 # ------------------------------------------------------------
 # App setup
 # ------------------------------------------------------------
 
-ph = PasswordHasher()
-
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", os.urandom(64))
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "poolclass": StaticPool,
-    "connect_args": {"check_same_thread": False},
-}
-
-db = SQLAlchemy()
-db.init_app(app)
+app = pitfalls_core.create_app(
+    __name__,
+    {
+        # Cache-Control per endpoint for conditionally served pages
+        "CACHE_CONTROL": {
+            "post_detail": "private, no-cache",
+        },
+    },
+)
+app.config["RATELIMIT_ROUTES"]["create_post"] = "write"
 
 
 # ------------------------------------------------------------
@@ -51,12 +57,8 @@ db.init_app(app)
 # ------------------------------------------------------------
 
 
-class User(db.Model):
+class User(UserMixin, db.Model):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    username = Column(String(64), unique=True, nullable=False, index=True)
-    password_hash = Column(String(256), nullable=False)
-    is_admin = Column(Boolean, default=False)
 
 
 class Post(db.Model):
@@ -73,30 +75,6 @@ class Flag(db.Model):
     flag = Column(Text, nullable=False)
 
 
-# ------------------------------------------------------------
-# Helper functions
-# ------------------------------------------------------------
-
-
-def get_current_user():
-    user_id = session.get("user_id")
-    if user_id:
-        return db.session.get(User, user_id)
-    return None
-
-
-@app.context_processor
-def inject_user():
-    return dict(current_user=get_current_user())
-
-
-def require_admin():
-    user = get_current_user()
-    if not user or not user.is_admin:
-        abort(403)
-    return user
-
-
 # ------------------------------------------------------------
 # Routes
 # ------------------------------------------------------------
@@ -108,64 +86,6 @@ def index():
     return render_template("index.html", posts=posts, current_username=(get_current_user().username if get_current_user() is not None else None))
 
 
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
-
-        if not username or not password:
-            flash("Username and password are required", "danger")
-            return redirect(url_for("register"))
-
-        existing_user = db.session.query(User).filter_by(username=username).first()
-        if existing_user:
-            flash("Username already exists", "danger")
-            return redirect(url_for("register"))
-
-        user = User(username=username, password_hash=ph.hash(password), is_admin=False)
-        db.session.add(user)
-        db.session.commit()
-
-        flash("Registration successful! Please log in.", "success")
-        return redirect(url_for("login"))
-
-    return render_template("register.html")
-
-
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
-
-        user = db.session.query(User).filter_by(username=username).first()
-
-        if not user:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
-
-        try:
-            ph.verify(user.password_hash, password)
-        except Exception:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
-
-        session["user_id"] = user.id
-        session["username"] = user.username
-        flash(f"Welcome back, {user.username}!", "success")
-        return redirect(url_for("index"))
-
-    return render_template("login.html")
-
-
-@app.route("/logout")
-def logout():
-    session.clear()
-    flash("You have been logged out", "info")
-    return redirect(url_for("index"))
-
-
 @app.route("/post/create", methods=["POST"])
 def create_post():
     current_user = get_current_user()
@@ -192,7 +112,10 @@ def post_detail(post_id):
     post = db.session.get(Post, post_id)
     if not post:
         abort(404)
-    return render_template("post_detail.html", post=post)
+
+    # Posts are never edited, so id and creation time identify the row version
+    etag = f"{post.id:x}-{post.created_at.timestamp():.6f}-{session.get('user_id', 0)}"
+    return conditional(etag, lambda: render_template("post_detail.html", post=post))
 
 
 @app.route("/post/<int:post_id>/report", methods=["POST"])
@@ -242,42 +165,42 @@ def health():
 # ------------------------------------------------------------
 
 
-def init_db():
-    with app.app_context():
-        db.create_all()
-
-        # Create admin user
-        admin_password = os.environ.get("ADMIN_PASSWORD", None)
-        admin = User(
-            username="admin", password_hash=ph.hash(admin_password), is_admin=True
-        )
-        db.session.add(admin)
+def seed_db():
+    # Add flag to separate table
+    flag = Flag(flag=os.environ.get("FLAG", "pitfalls{fake_flag}"))
+    db.session.add(flag)
 
-        # Add flag to separate table
-        flag = Flag(flag=os.environ.get("FLAG", "pitfalls{fake_flag}"))
-        db.session.add(flag)
-
-        # Add some sample posts
-        posts = [
-            Post(
-                author="Alice",
-                content="Welcome to <i>Náměstí</i>! This is a great platform.",
-            ),
-            Post(author="Bob", content="Just posted my first message here!"),
-            Post(
-                author="Charlie", content="Looking forward to connecting with everyone."
-            ),
-        ]
-        for post in posts:
-            db.session.add(post)
-
-        db.session.commit()
+    # Add some sample posts
+    posts = [
+        Post(
+            author="Alice",
+            content="Welcome to <i>Náměstí</i>! This is a great platform.",
+        ),
+        Post(author="Bob", content="Just posted my first message here!"),
+        Post(author="Charlie", content="Looking forward to connecting with everyone."),
+    ]
+    for post in posts:
+        db.session.add(post)
 
 
 # ------------------------------------------------------------
 # Main
 # ------------------------------------------------------------
 
+def create_app():
+    init_db(app, seed=seed_db)
+    health = app.extensions["health"]
+    health.probe(
+        "report_queue_log",
+        filesystem_probe(os.path.dirname(os.path.abspath(report_queue.path))),
+    )
+    # Deliver reports left over from a previous run
+    if RQ_ENABLED:
+        report_queue.start()
+        # Reports wait in the log while Redis is down, so the app still works
+        health.probe("redis", redis_probe(report_queue.redis_url), critical=False)
+    return pitfalls_core.ready(app)
+
+
 if __name__ == "__main__":
-    init_db()
-    app.run(debug=False, host="0.0.0.0", port=8080)
+    create_app().run(debug=False, host="0.0.0.0", port=8080)
@@ -0,0 +1,51 @@
+"""
+Local stand-in for the hCaptcha siteverify API, so the Personal Space app
+can be tested with real verification and without network access.
+
+    python hcaptcha_stub.py [port]
+    HCAPTCHA_VERIFY=api HCAPTCHA_VERIFY_URL=http://127.0.0.1:8099/siteverify uv run app.py
+
+Every non-empty response token passes except those starting with "fail".
+STUB_DELAY adds that many seconds of latency to each answer.
+"""
+
+import json
+import os
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+DELAY = float(os.environ.get("STUB_DELAY", "0"))
+
+
+class SiteverifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        if self.path != "/siteverify":
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        token = form.get("response", [""])[0]
+        success = bool(token) and not token.startswith("fail")
+
+        time.sleep(DELAY)
+        body = json.dumps(
+            {"success": success}
+            if success
+            else {"success": False, "error-codes": ["invalid-input-response"]}
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8099
+    print(f"hCaptcha stub listening on 127.0.0.1:{port}")
+    ThreadingHTTPServer(("127.0.0.1", port), SiteverifyHandler).serve_forever()
@@ -1,45 +1,77 @@
+import asyncio
+import atexit
+import difflib
+import hashlib
+import importlib.util
+import json
+import mimetypes
 import os
 import re
+import secrets
+import threading
+import time
+from collections import Counter
+from datetime import datetime
 
+import pitfalls_core
 from flask import (
-    Flask,
     render_template,
     request,
     redirect,
     url_for,
     flash,
-    session,
     abort,
+    g,
+    send_from_directory,
+    jsonify,
 )
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Boolean, Column, Integer, String, Text
-from sqlalchemy.pool import StaticPool
-from argon2 import PasswordHasher
+from pitfalls_core import (
+    ReportQueue,
+    UserMixin,
+    conditional,
+    db,
+    filesystem_probe,
+    init_db,
+    redis_probe,
+    require_login,
+)
+from pitfalls_core.metrics import operation_timed
+from sqlalchemy import Boolean, Column, DateTime, Integer, Text, func
 
-try:
-    from redis import Redis
-    from rq import Queue
+# ------------------------------------------------------------
+# Admin review queue
+# ------------------------------------------------------------
 
-    redis_conn = Redis(host="redis", port=6379)
-    report_queue = Queue("default", connection=redis_conn)
-    RQ_ENABLED = True
-except Exception:
-    RQ_ENABLED = False
+RQ_ENABLED = importlib.util.find_spec("rq") is not None
+report_queue = ReportQueue(
+    os.environ.get("REPORT_QUEUE_LOG", "report_queue.log"),
+    os.environ.get("REDIS_URL", "redis://redis:6379"),
+)
 
 # ------------------------------------------------------------
 # App setup
 # ------------------------------------------------------------
 
-ph = PasswordHasher()
-
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", os.urandom(64))
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "poolclass": StaticPool,
-    "connect_args": {"check_same_thread": False},
+app = pitfalls_core.create_app(
+    __name__,
+    {
+        "ADMIN_PASSWORD": os.environ.get("ADMIN_PASSWORD", "admin123"),
+        "AUTH_HOME": "space",
+    },
+)
+# Cache-Control per endpoint for conditionally served pages
+app.config["CACHE_CONTROL"] = {
+    "space": "private, no-cache",
 }
+app.config["RATELIMIT_ROUTES"]["space_update"] = "write"
+# "enforce" or "report-only"
+app.config["CSP_MODE"] = os.environ.get("CSP_MODE", "enforce")
+app.config["CSP_REPORT_FLUSH_INTERVAL"] = 60.0
+app.config["CSP_REPORT_FLUSH_SIZE"] = 500
+# Every Nth note revision is stored in full instead of as a delta
+app.config["NOTE_SNAPSHOT_EVERY"] = 20
+# Revisions kept per user beyond the newest, rounded up to a snapshot
+app.config["NOTE_HISTORY_LIMIT"] = 100
 
 HCAPTCHA_SECRET = os.environ.get(
     "HCAPTCHA_SECRET", "0x0000000000000000000000000000000000000000"
@@ -47,9 +79,12 @@ HCAPTCHA_SECRET = os.environ.get(
 HCAPTCHA_SITEKEY = os.environ.get(
     "HCAPTCHA_SITEKEY", "10000000-ffff-ffff-ffff-000000000001"
 )
-
-db = SQLAlchemy()
-db.init_app(app)
+# "presence" accepts any non-empty response (as with the test keys and in
+# ReCodEx), "api" asks the siteverify endpoint
+HCAPTCHA_VERIFY = os.environ.get("HCAPTCHA_VERIFY", "presence")
+HCAPTCHA_VERIFY_URL = os.environ.get(
+    "HCAPTCHA_VERIFY_URL", "https://api.hcaptcha.com/siteverify"
+)
 
 
 # ------------------------------------------------------------
@@ -57,13 +92,30 @@ db.init_app(app)
 # ------------------------------------------------------------
 
 
-class User(db.Model):
+class User(UserMixin, db.Model):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    username = Column(String(64), unique=True, nullable=False, index=True)
-    password_hash = Column(String(256), nullable=False)
-    is_admin = Column(Boolean, default=False)
     note_content = Column(Text, default="")
+    note_version = Column(Integer, nullable=False, default=1)
+
+    @classmethod
+    def new_account(cls, username, password, **fields):
+        fields.setdefault(
+            "note_content",
+            "Welcome to your Personal Space! Edit this note to make it your own.",
+        )
+        return super().new_account(username, password, **fields)
+
+
+class NoteRevision(db.Model):
+    __tablename__ = "note_revisions"
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    version = Column(Integer, nullable=False)
+    # Snapshots hold the full note, other revisions a JSON line delta
+    # against the previous version
+    is_snapshot = Column(Boolean, nullable=False, default=False)
+    data = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 # ------------------------------------------------------------
@@ -71,31 +123,260 @@ class User(db.Model):
 # ------------------------------------------------------------
 
 
-def get_current_user():
-    user_id = session.get("user_id")
-    if user_id:
-        return db.session.get(User, user_id)
-    return None
+@app.context_processor
+def inject_sitekey():
+    return dict(hcaptcha_sitekey=HCAPTCHA_SITEKEY)
 
 
-@app.context_processor
-def inject_user():
-    return dict(current_user=get_current_user(), hcaptcha_sitekey=HCAPTCHA_SITEKEY)
+# ------------------------------------------------------------
+# Note revisions
+# ------------------------------------------------------------
+#
+# A delta is a list of operations over the note's "\n"-separated lines:
+# a non-negative int keeps that many lines, a negative int drops that many
+# lines and a list of strings inserts those lines. Lines not covered by
+# the delta are kept.
+
+
+def diff_lines(old, new):
+    a, b = old.split("\n"), new.split("\n")
+    delta = []
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            delta.append(i2 - i1)
+            continue
+        if i2 > i1:
+            delta.append(i1 - i2)
+        if j2 > j1:
+            delta.append(b[j1:j2])
+    if delta and isinstance(delta[-1], int) and delta[-1] > 0:
+        delta.pop()
+    return delta
+
+
+def apply_delta(text, delta):
+    lines = text.split("\n")
+    out = []
+    pos = 0
+    for op in delta:
+        if isinstance(op, list) and all(isinstance(line, str) for line in op):
+            out.extend(op)
+        elif isinstance(op, int) and not isinstance(op, bool):
+            if pos + abs(op) > len(lines):
+                raise ValueError("delta runs past the end of the note")
+            if op > 0:
+                out.extend(lines[pos : pos + op])
+            pos += abs(op)
+        else:
+            raise ValueError(f"invalid delta operation: {op!r}")
+    out.extend(lines[pos:])
+    return "\n".join(out)
+
+
+def save_note(user, content, delta=None):
+    """
+    Store `content` as the user's next note version. Only the delta against
+    the previous version is written to the history, with a full snapshot
+    every NOTE_SNAPSHOT_EVERY versions.
+    """
+    previous = user.note_content or ""
+    if delta is None:
+        delta = diff_lines(previous, content)
+
+    has_history = (
+        db.session.query(NoteRevision.id).filter_by(user_id=user.id).first() is not None
+    )
+    if not has_history:
+        db.session.add(
+            NoteRevision(
+                user_id=user.id,
+                version=user.note_version,
+                is_snapshot=True,
+                data=previous,
+            )
+        )
 
+    version = user.note_version + 1
+    is_snapshot = version % app.config["NOTE_SNAPSHOT_EVERY"] == 0
+    db.session.add(
+        NoteRevision(
+            user_id=user.id,
+            version=version,
+            is_snapshot=is_snapshot,
+            data=content if is_snapshot else json.dumps(delta, separators=(",", ":")),
+        )
+    )
+    user.note_content = content
+    user.note_version = version
+
+    if is_snapshot:
+        compact_note_history(user.id, version)
+
+
+def compact_note_history(user_id, version):
+    # Drop everything older than the newest snapshot outside the limit,
+    # so the oldest kept revision is always a snapshot
+    cutoff = (
+        db.session.query(func.max(NoteRevision.version))
+        .filter(
+            NoteRevision.user_id == user_id,
+            NoteRevision.is_snapshot.is_(True),
+            NoteRevision.version <= version - app.config["NOTE_HISTORY_LIMIT"],
+        )
+        .scalar()
+    )
+    if cutoff is not None:
+        db.session.query(NoteRevision).filter(
+            NoteRevision.user_id == user_id, NoteRevision.version < cutoff
+        ).delete()
+
+
+def note_at(user, version):
+    if version > user.note_version:
+        return None
+    if version == user.note_version:
+        return user.note_content
+
+    base = (
+        db.session.query(NoteRevision)
+        .filter(
+            NoteRevision.user_id == user.id,
+            NoteRevision.is_snapshot.is_(True),
+            NoteRevision.version <= version,
+        )
+        .order_by(NoteRevision.version.desc())
+        .first()
+    )
+    if base is None:
+        return None
+
+    text = base.data
+    revisions = (
+        db.session.query(NoteRevision)
+        .filter(
+            NoteRevision.user_id == user.id,
+            NoteRevision.version > base.version,
+            NoteRevision.version <= version,
+        )
+        .order_by(NoteRevision.version)
+    )
+    for revision in revisions:
+        text = (
+            revision.data
+            if revision.is_snapshot
+            else apply_delta(text, json.loads(revision.data))
+        )
+    return text
 
-def require_login():
-    user = get_current_user()
+
+def note_sha256(content):
+    return hashlib.sha256((content or "").encode()).hexdigest()
+
+
+def target_user(current_user):
+    # Admin can work with other users' spaces
+    username = request.args.get("user")
+    if not current_user.is_admin or not username:
+        return current_user
+    user = db.session.query(User).filter_by(username=username).first()
     if not user:
-        flash("Please log in first.", "danger")
-        abort(403)
+        abort(404)
     return user
 
 
-def require_admin():
-    user = get_current_user()
-    if not user or not user.is_admin:
-        abort(403)
-    return user
+# ------------------------------------------------------------
+# hCaptcha
+# ------------------------------------------------------------
+
+
+class PresenceVerifier:
+    """Accepts any non-empty hCaptcha response."""
+
+    def verify(self, token, remote_ip=None):
+        return bool(token)
+
+
+class HCaptchaVerifier:
+    """
+    Checks responses against the hCaptcha siteverify API. Every response is
+    sent to hCaptcha, as a token is only good for one verification.
+
+    All calls run on one background event loop sharing an httpx.AsyncClient,
+    so connections are pooled across request threads. The loop is started on
+    first use in each process: one started at import would not exist in
+    workers forked from a preloading gunicorn master.
+    """
+
+    def __init__(self, secret, sitekey, url, timeout=3.0):
+        self.secret = secret
+        self.sitekey = sitekey
+        self.url = url
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def _start(self):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout, limits=httpx.Limits(max_keepalive_connections=8)
+        )
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=self._loop.run_forever, name="hcaptcha", daemon=True
+        ).start()
+        self._pid = os.getpid()
+
+    async def _siteverify(self, token, remote_ip):
+        data = {"secret": self.secret, "sitekey": self.sitekey, "response": token}
+        if remote_ip:
+            data["remoteip"] = remote_ip
+        response = await self._client.post(self.url, data=data)
+        return response.json().get("success") is True
+
+    def verify(self, token, remote_ip=None):
+        if not token:
+            return False
+
+        with self._lock:
+            if self._pid != os.getpid():
+                self._start()
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._siteverify(token, remote_ip), self._loop
+        )
+        try:
+            return future.result(self.timeout)
+        except Exception as e:
+            future.cancel()
+            app.logger.warning(f"hCaptcha verification failed: {e}")
+            return False
+
+
+if HCAPTCHA_VERIFY == "api":
+    captcha_verifier = HCaptchaVerifier(
+        HCAPTCHA_SECRET, HCAPTCHA_SITEKEY, HCAPTCHA_VERIFY_URL
+    )
+else:
+    captcha_verifier = PresenceVerifier()
+
+
+def verify_captcha(token):
+    start = time.perf_counter()
+    try:
+        return captcha_verifier.verify(token, request.remote_addr)
+    finally:
+        elapsed = time.perf_counter() - start
+        g.captcha_ms = elapsed * 1000
+        operation_timed.send(app, operation="captcha", seconds=elapsed)
+
+
+@app.after_request
+def captcha_timing(response):
+    if "captcha_ms" in g:
+        response.headers.add("Server-Timing", f"captcha;dur={g.captcha_ms:.1f}")
+    return response
 
 
 # ------------------------------------------------------------
@@ -103,92 +384,223 @@ def require_admin():
 # ------------------------------------------------------------
 
 
+class HeaderPolicy:
+    """
+    A Content-Security-Policy header built once at startup.
+
+    A `{nonce}` placeholder in any directive is replaced with the per-request
+    nonce from csp_nonce(); policies without one are attached as-is.
+    """
+
+    def __init__(self, directives, report_only=False, report_uri=None):
+        if report_only and report_uri:
+            directives = [*directives, f"report-uri {report_uri}"]
+        self.name = (
+            "Content-Security-Policy-Report-Only"
+            if report_only
+            else "Content-Security-Policy"
+        )
+        self.value = "; ".join(directives)
+        self.uses_nonce = "{nonce}" in self.value
+
+    def apply(self, response):
+        value = self.value
+        if self.uses_nonce:
+            value = value.replace("{nonce}", csp_nonce())
+        response.headers[self.name] = value
+
+
+class CspReportBuffer:
+    """
+    Aggregates CSP violation reports in memory and logs one summary per batch,
+    either every `flush_interval` seconds or once `flush_size` reports arrived.
+    """
+
+    def __init__(self, flush_interval, flush_size):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._counts = Counter()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def add(self, directive, blocked, document):
+        with self._lock:
+            self._counts[(directive, blocked, document)] += 1
+            self._pending += 1
+            due = (
+                self._pending >= self.flush_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            counts, self._counts = self._counts, Counter()
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        if counts:
+            app.logger.warning(
+                "CSP violations (%d reports):\n%s",
+                sum(counts.values()),
+                "\n".join(
+                    f"  {n}x {directive} blocked {blocked} on {document}"
+                    for (directive, blocked, document), n in counts.most_common()
+                ),
+            )
+
+
+def csp_nonce():
+    nonce = g.get("csp_nonce")
+    if nonce is None:
+        nonce = g.csp_nonce = secrets.token_urlsafe(16)
+    return nonce
+
+
+app.jinja_env.globals["csp_nonce"] = csp_nonce
+
+CSP_REPORT_ONLY = app.config["CSP_MODE"] == "report-only"
+
+PAGE_CSP = HeaderPolicy(
+    [
+        "script-src 'self' https://hcaptcha.com https://*.hcaptcha.com 'unsafe-eval'",
+        "style-src 'self' https://cdn.jsdelivr.net/npm/bulma@1.0.4/css/bulma.min.css https://hcaptcha.com https://*.hcaptcha.com",
+        "frame-src https://hcaptcha.com https://*.hcaptcha.com",
+        "connect-src 'self' https://hcaptcha.com https://*.hcaptcha.com",
+        "img-src 'self'",
+        "base-uri 'none'",
+        "default-src 'none'",
+        "frame-ancestors 'none'",
+    ],
+    report_only=CSP_REPORT_ONLY,
+    report_uri="/csp-report",
+)
+STATIC_CSP = HeaderPolicy(
+    ["default-src 'none'", "frame-ancestors 'none'"], report_only=CSP_REPORT_ONLY
+)
+
+# Route class per endpoint; anything not listed is a page.
+# A class mapped to None gets no CSP header at all.
+CSP_ROUTE_CLASSES = {
+    "static": "static",
+    "assets": "static",
+    "health": "health",
+    "health_deep": "health",
+    "csp_report": "health",
+}
+CSP_POLICIES = {
+    "page": PAGE_CSP,
+    "static": STATIC_CSP,
+    "health": None,
+}
+
+csp_reports = CspReportBuffer(
+    app.config["CSP_REPORT_FLUSH_INTERVAL"], app.config["CSP_REPORT_FLUSH_SIZE"]
+)
+atexit.register(csp_reports.flush)
+
+
 @app.after_request
 def set_csp(response):
-    response.headers["Content-Security-Policy"] = (
-        "script-src 'self' https://hcaptcha.com https://*.hcaptcha.com 'unsafe-eval'; "
-        "style-src 'self' https://cdn.jsdelivr.net/npm/bulma@1.0.1/css/bulma.min.css https://hcaptcha.com https://*.hcaptcha.com; "
-        "frame-src https://hcaptcha.com https://*.hcaptcha.com;"
-        "connect-src 'self' https://hcaptcha.com https://*.hcaptcha.com;"
-        "img-src 'self';"
-        "base-uri 'none';"
-        "default-src 'none';"
-        "frame-ancestors 'none'"
-    )
+    policy = CSP_POLICIES[CSP_ROUTE_CLASSES.get(request.endpoint, "page")]
+    if policy is not None:
+        policy.apply(response)
     return response
 
 
+@app.route("/csp-report", methods=["POST"])
+def csp_report():
+    payload = request.get_json(force=True, silent=True)
+    # application/csp-report sends one object, application/reports+json a list
+    if isinstance(payload, dict) and isinstance(payload.get("csp-report"), dict):
+        report = payload["csp-report"]
+        csp_reports.add(
+            report.get("effective-directive") or report.get("violated-directive"),
+            report.get("blocked-uri"),
+            report.get("document-uri"),
+        )
+    elif isinstance(payload, list):
+        for entry in payload:
+            body = entry.get("body") if isinstance(entry, dict) else None
+            if isinstance(body, dict):
+                csp_reports.add(
+                    body.get("effectiveDirective"),
+                    body.get("blockedURL"),
+                    body.get("documentURL"),
+                )
+    return "", 204
+
+
 # ------------------------------------------------------------
-# Routes
+# Static assets
 # ------------------------------------------------------------
 
-
-@app.route("/")
-def index():
-    return render_template("index.html")
+# Built by build_assets.py; without a build the plain static files are used
+ASSET_DIR = os.path.join(app.static_folder, "dist")
+ASSET_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ASSET_FALLBACKS = {
+    "vendor/bulma.min.css": "https://cdn.jsdelivr.net/npm/bulma@1.0.4/css/bulma.min.css",
+}
 
 
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
+def load_asset_manifest():
+    try:
+        with open(os.path.join(ASSET_DIR, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-        if not username or not password:
-            flash("Username and password are required", "danger")
-            return redirect(url_for("register"))
 
-        existing_user = db.session.query(User).filter_by(username=username).first()
-        if existing_user:
-            flash("Username already exists", "danger")
-            return redirect(url_for("register"))
+asset_manifest = load_asset_manifest()
+# built file -> precompressed encodings available for it
+asset_encodings = {
+    entry["file"]: set(entry["encodings"]) for entry in asset_manifest.values()
+}
 
-        user = User(
-            username=username,
-            password_hash=ph.hash(password),
-            is_admin=False,
-            note_content="Welcome to your Personal Space! Edit this note to make it your own.",
-        )
-        db.session.add(user)
-        db.session.commit()
 
-        flash("Registration successful! Please log in.", "success")
-        return redirect(url_for("login"))
+def asset_url(name):
+    entry = asset_manifest.get(name)
+    if entry is not None:
+        return url_for("assets", filename=entry["file"])
+    if name in ASSET_FALLBACKS:
+        return ASSET_FALLBACKS[name]
+    return url_for("static", filename=name)
 
-    return render_template("register.html")
 
+app.jinja_env.globals["asset_url"] = asset_url
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
 
-        user = db.session.query(User).filter_by(username=username).first()
+@app.route("/assets/<path:filename>")
+def assets(filename):
+    if filename not in asset_encodings:
+        abort(404)
 
-        if not user:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in ASSET_ENCODINGS:
+        if encoding in asset_encodings[filename] and request.accept_encodings[encoding]:
+            response = send_from_directory(
+                ASSET_DIR, filename + suffix, mimetype=mimetype
+            )
+            response.headers["Content-Encoding"] = encoding
+            break
+    else:
+        response = send_from_directory(ASSET_DIR, filename, mimetype=mimetype)
 
-        try:
-            ph.verify(user.password_hash, password)
-        except Exception:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
+    response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    response.vary.add("Accept-Encoding")
+    return response
 
-        session["user_id"] = user.id
-        session["username"] = user.username
-        flash(f"Welcome back, {user.username}!", "success")
-        return redirect(url_for("space"))
 
-    return render_template("login.html")
+# ------------------------------------------------------------
+# Routes
+# ------------------------------------------------------------
 
 
-@app.route("/logout")
-def logout():
-    session.clear()
-    flash("You have been logged out", "info")
-    return redirect(url_for("index"))
+@app.route("/")
+def index():
+    return render_template("index.html")
 
 
 @app.route("/space")
@@ -205,13 +617,18 @@ def space():
                 flash("User not found", "danger")
                 return redirect(url_for("space"))
 
-    return render_template("space.html", view_user=view_user)
+    etag = f"{view_user.id:x}-{view_user.note_version:x}-{current_user.id:x}"
+    return conditional(etag, lambda: render_template("space.html", view_user=view_user))
 
 
 @app.route("/space/edit", methods=["GET"])
 def space_edit():
     current_user = require_login()
-    return render_template("space_edit.html")
+    # The page patches against this digest: browsers only have crypto.subtle
+    # on https, and the app is also served over plain http
+    return render_template(
+        "space_edit.html", base_sha256=note_sha256(current_user.note_content)
+    )
 
 
 @app.route("/space/update", methods=["POST"])
@@ -220,9 +637,9 @@ def space_update():
 
     # Verify hCaptcha
     # For testing with hCaptcha test keys, we accept any response (this is also the case in ReCodEx)
-    # In real production, we would verify with hCaptcha API
+    # Set HCAPTCHA_VERIFY=api to verify with the hCaptcha API
     hcaptcha_response = request.form.get("h-captcha-response", "")
-    if not hcaptcha_response:
+    if not verify_captcha(hcaptcha_response):
         flash("Please complete the hCaptcha verification", "danger")
         return redirect(url_for("space_edit"))
 
@@ -237,13 +654,77 @@ def space_update():
                 return redirect(url_for("space_edit"))
 
     content = request.form.get("content", "")
-    view_user.note_content = content
+    save_note(view_user, content)
     db.session.commit()
 
     flash("Updated!", "success")
     return redirect(url_for("space"))
 
 
+@app.route("/space/patch", methods=["POST"])
+def space_patch():
+    current_user = require_login()
+
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        return jsonify(error="Expected a JSON object"), 400
+
+    # Everything that can reject the patch is checked before the captcha,
+    # whose token is single-use: the user has to solve a new one after it
+    view_user = target_user(current_user)
+    if payload.get("base_version") != view_user.note_version:
+        return jsonify(error="Note changed", version=view_user.note_version), 409
+    # The delta must have been taken against exactly the stored text, or
+    # its line counts land on the wrong lines
+    base = view_user.note_content or ""
+    if payload.get("base_sha256") != note_sha256(base):
+        return jsonify(error="Delta is not against the stored note"), 409
+
+    delta = payload.get("delta")
+    try:
+        if not isinstance(delta, list):
+            raise ValueError("delta must be a list")
+        content = apply_delta(base, delta)
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+
+    if not verify_captcha(payload.get("h-captcha-response", "")):
+        return jsonify(error="Please complete the hCaptcha verification"), 400
+
+    save_note(view_user, content, delta)
+    db.session.commit()
+
+    # space_edit.js moves on to /space when this succeeds, and the flash
+    # shows there just as after a full form submit
+    flash("Updated!", "success")
+    return jsonify(version=view_user.note_version)
+
+
+@app.route("/space/revisions")
+def space_revisions():
+    view_user = target_user(require_login())
+    revisions = (
+        db.session.query(NoteRevision.version, NoteRevision.created_at)
+        .filter_by(user_id=view_user.id)
+        .order_by(NoteRevision.version.desc())
+    )
+    return jsonify(
+        [
+            {"version": version, "created_at": created_at.isoformat()}
+            for version, created_at in revisions
+        ]
+    )
+
+
+@app.route("/space/revisions/<int:version>")
+def space_revision(version):
+    view_user = target_user(require_login())
+    content = note_at(view_user, version)
+    if content is None:
+        abort(404)
+    return jsonify(version=version, content=content)
+
+
 @app.route("/space/request_guidance", methods=["POST"])
 def request_guidance():
     current_user = require_login()
@@ -275,32 +756,26 @@ def health():
 
 
 # ------------------------------------------------------------
-# Database initialization
+# Main
 # ------------------------------------------------------------
 
 
-def init_db():
-    with app.app_context():
-        db.create_all()
-
-        # Create admin user with flag in note
-        admin_password = os.environ.get("ADMIN_PASSWORD", "admin123")
-        flag = os.environ.get("FLAG", "pitfalls{fake_flag}")
-
-        admin = User(
-            username="admin",
-            password_hash=ph.hash(admin_password),
-            is_admin=True,
-            note_content=f"Welcome admin! Your flag is: {flag}",
-        )
-        db.session.add(admin)
-        db.session.commit()
-
+def create_app():
+    # Admin's note holds the flag
+    flag = os.environ.get("FLAG", "pitfalls{fake_flag}")
+    init_db(app, note_content=f"Welcome admin! Your flag is: {flag}")
+    health = app.extensions["health"]
+    health.probe(
+        "report_queue_log",
+        filesystem_probe(os.path.dirname(os.path.abspath(report_queue.path))),
+    )
+    # Deliver reports left over from a previous run
+    if RQ_ENABLED:
+        report_queue.start()
+        # Reports wait in the log while Redis is down, so the app still works
+        health.probe("redis", redis_probe(report_queue.redis_url), critical=False)
+    return pitfalls_core.ready(app)
 
-# ------------------------------------------------------------
-# Main
-# ------------------------------------------------------------
 
 if __name__ == "__main__":
-    init_db()
-    app.run(debug=False, host="0.0.0.0", port=8080)
+    create_app().run(debug=False, host="0.0.0.0", port=8080)
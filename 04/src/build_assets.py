@@ -0,0 +1,129 @@
+"""
+Build fingerprinted static assets for the Personal Space app.
+
+Every file under static/ (and the vendored Bulma stylesheet) is minified,
+written to static/dist/ under a content-hashed name, and precompressed
+with gzip and brotli. static/dist/manifest.json maps each logical name,
+as passed to asset_url() in the templates, to its built file.
+
+Run once at image build time:
+
+    uv run build_assets.py
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import urllib.request
+
+import brotli
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+
+# Third-party files served from static/vendor/ instead of a CDN. They are
+# committed, so the build works offline; the url is where a missing one is
+# fetched from. name -> (url, sha256 of the release it was checked against)
+VENDOR = {
+    "vendor/bulma.min.css": (
+        "https://cdn.jsdelivr.net/npm/bulma@1.0.4/css/bulma.min.css",
+        "67fa26df1ca9e95d8f2adc7c04fa1b15fa3d24257470ebc10cc68b9aab914bee",
+    ),
+}
+
+
+def vendor():
+    """Fetch missing vendored files; every one, old or new, must match its pin."""
+    for name, (url, sha256) in VENDOR.items():
+        path = os.path.join(STATIC_DIR, name)
+        fetched = not os.path.exists(path)
+        if fetched:
+            with urllib.request.urlopen(url, timeout=30) as response:
+                data = response.read()
+        else:
+            with open(path, "rb") as f:
+                data = f.read()
+
+        digest = hashlib.sha256(data).hexdigest()
+        if digest != sha256:
+            raise SystemExit(
+                f"{name} ({url}) has sha256 {digest}, "
+                f"expected {sha256 or 'a pinned digest in VENDOR'}"
+            )
+        if fetched:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+            print(f"vendored {url} -> {name}")
+
+
+def minify_js(source):
+    # Conservative: drop comments and indentation, keep line breaks for ASI
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.DOTALL)
+    lines = (line.strip() for line in source.splitlines())
+    return "\n".join(line for line in lines if line and not line.startswith("//"))
+
+
+def minify_css(source):
+    source = re.sub(r"/\*.*?\*/", "", source, flags=re.DOTALL)
+    source = re.sub(r"\s+", " ", source)
+    return re.sub(r"\s*([{};:,>])\s*", r"\1", source).strip()
+
+
+def minify(name, data):
+    if ".min." in name:
+        return data
+    if name.endswith(".js"):
+        return minify_js(data.decode()).encode()
+    if name.endswith(".css"):
+        return minify_css(data.decode()).encode()
+    return data
+
+
+def build_asset(name):
+    with open(os.path.join(STATIC_DIR, name), "rb") as f:
+        data = minify(name, f.read())
+
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    built = f"{stem}.{digest}{ext}"
+    path = os.path.join(DIST_DIR, built)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+    encodings = []
+    for encoding, suffix, compressed in (
+        ("br", ".br", brotli.compress(data, quality=11)),
+        ("gzip", ".gz", gzip.compress(data, compresslevel=9, mtime=0)),
+    ):
+        if len(compressed) < len(data):
+            with open(path + suffix, "wb") as f:
+                f.write(compressed)
+            encodings.append(encoding)
+
+    print(f"{name} -> {built} ({len(data)} bytes, {' '.join(encodings) or 'raw'})")
+    return {"file": built, "encodings": encodings}
+
+
+def main():
+    vendor()
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+
+    manifest = {}
+    for root, _, files in os.walk(STATIC_DIR):
+        if root.startswith(DIST_DIR):
+            continue
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), STATIC_DIR)
+            manifest[name.replace(os.sep, "/")] = build_asset(name)
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
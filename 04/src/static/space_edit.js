@@ -0,0 +1,105 @@
+// Save the personal space by sending only the changed lines. Without
+// JavaScript the form is submitted in full as before.
+//
+// The delta is taken against the note exactly as stored, which the page
+// carries as JSON: the textarea's own text has its line endings normalised
+// and a leading newline dropped, so lines counted in it can be off. The
+// server puts the stored note's SHA-256 on the form next to its version.
+//
+// A rejected patch is shown to the user rather than retried as a full
+// submit, which would overwrite a newer note and reuse a spent captcha.
+
+/**
+ * Line delta turning `before` into `after`, in the format /space/patch accepts
+ */
+function lineDelta(before, after) {
+  const a = before.split("\n");
+  const b = after.split("\n");
+
+  let start = 0;
+  while (start < a.length && start < b.length && a[start] === b[start]) {
+    start++;
+  }
+  let end = 0;
+  while (
+    end < a.length - start &&
+    end < b.length - start &&
+    a[a.length - 1 - end] === b[b.length - 1 - end]
+  ) {
+    end++;
+  }
+
+  const delta = [];
+  if (start > 0) {
+    delta.push(start);
+  }
+  const removed = a.length - start - end;
+  if (removed > 0) {
+    delta.push(-removed);
+  }
+  const inserted = b.slice(start, b.length - end);
+  if (inserted.length > 0) {
+    delta.push(inserted);
+  }
+  return delta;
+}
+
+/**
+ * Show `message` above the buttons, or hide the notice when it is empty
+ */
+function showError(form, message) {
+  const notice = form.querySelector(".patch-error");
+  notice.textContent = message;
+  notice.hidden = !message;
+}
+
+document.addEventListener("DOMContentLoaded", function () {
+  const form = document.getElementById("editForm");
+  if (!form) return;
+
+  const content = form.querySelector("textarea[name='content']");
+  const base = JSON.parse(document.getElementById("noteBase").textContent);
+
+  form.addEventListener("submit", async function (event) {
+    event.preventDefault();
+    showError(form, "");
+    const captcha = form.querySelector("[name='h-captcha-response']");
+
+    let response;
+    try {
+      response = await fetch(form.dataset.patchUrl, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({
+          base_version: parseInt(form.dataset.version, 10),
+          base_sha256: form.dataset.baseSha256,
+          delta: lineDelta(base, content.value),
+          "h-captcha-response": captcha ? captcha.value : "",
+        }),
+      });
+    } catch (e) {
+      console.error("Patch failed:", e);
+      showError(form, "Could not reach the server, please try again.");
+      return;
+    }
+    if (response.ok) {
+      window.location = form.dataset.doneUrl;
+      return;
+    }
+
+    if (response.status === 409) {
+      showError(
+        form,
+        "Your note was changed since this page was opened. Copy your text, " +
+          "reload the page and apply it to the latest version.",
+      );
+      return;
+    }
+    const body = await response.json().catch(() => ({}));
+    showError(form, body.error || "Saving failed, please try again.");
+    // A captcha the server has checked cannot be sent again
+    if (window.hcaptcha) {
+      window.hcaptcha.reset();
+    }
+  });
+});
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+
+import app as personal_space  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # create_app() seeds the admin account, so it runs once per session
+    os.environ["REPORT_QUEUE_LOG"] = str(tmp_path_factory.mktemp("q") / "log")
+    return personal_space.create_app()
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a new user of its own (client.username)."""
+    client = app.test_client()
+    account = {"username": f"user{os.urandom(4).hex()}", "password": "pw"}
+    client.post("/register", data=account)
+    client.post("/login", data=account)
+    client.username = account["username"]
+    return client
@@ -0,0 +1,127 @@
+import hashlib
+
+import pytest
+from pitfalls_core.metrics import operation_timed
+
+import app as personal_space
+from app import User, apply_delta, db, diff_lines
+
+
+def stored_note(app, username):
+    with app.app_context():
+        return db.session.query(User).filter_by(username=username).one()
+
+
+def set_note(app, username, content):
+    with app.app_context():
+        user = db.session.query(User).filter_by(username=username).one()
+        user.note_content = content
+        db.session.commit()
+        return user.note_version
+
+
+def patch(client, version, base, new):
+    return client.post(
+        "/space/patch",
+        json={
+            "base_version": version,
+            "base_sha256": hashlib.sha256(base.encode()).hexdigest(),
+            "delta": diff_lines(base, new),
+            "h-captcha-response": "x",
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        ("a\nb\nc", "a\nB\nc"),
+        ("a\nb\nc", "x\na\nb\nc\ny"),
+        ("a\nb\nc", ""),
+        ("", "one\ntwo"),
+        ("\nlead\r\ncrlf\r\n", "lead\ncrlf\n"),
+    ],
+)
+def test_diff_then_apply_gives_the_new_text(old, new):
+    assert apply_delta(old, diff_lines(old, new)) == new
+
+
+def test_apply_delta_rejects_running_past_the_end():
+    with pytest.raises(ValueError):
+        apply_delta("a\nb", [1, -5])
+    with pytest.raises(ValueError):
+        apply_delta("a\nb", [True])
+
+
+def test_patch_against_the_stored_note(app, client):
+    stored = "\nfirst\r\nsecond\r\nthird"
+    version = set_note(app, client.username, stored)
+    # What the browser's textarea shows and sends: CRLF normalised, the
+    # leading newline dropped, one line edited
+    edited = "first\nSECOND\nthird"
+
+    response = patch(client, version, stored, edited)
+
+    assert response.status_code == 200
+    user = stored_note(app, client.username)
+    assert user.note_content == edited
+    assert user.note_version == version + 1
+
+
+def test_patch_against_other_text_is_rejected(app, client):
+    stored = "\nfirst\r\nsecond\r\nthird"
+    version = set_note(app, client.username, stored)
+    # A delta taken against the textarea's text counts lines differently
+    textarea = "first\nsecond\nthird"
+
+    response = patch(client, version, textarea, "first\nSECOND\nthird")
+
+    assert response.status_code == 409
+    assert stored_note(app, client.username).note_content == stored
+
+
+def test_edit_page_carries_the_stored_note_digest(app, client):
+    set_note(app, client.username, "\nfirst\r\nsecond")
+
+    page = client.get("/space/edit").text
+
+    digest = hashlib.sha256(b"\nfirst\r\nsecond").hexdigest()
+    assert f'data-base-sha256="{digest}"' in page
+
+
+class RecordingVerifier:
+    def __init__(self):
+        self.tokens = []
+
+    def verify(self, token, remote_ip):
+        self.tokens.append(token)
+        return True
+
+
+@pytest.mark.parametrize(
+    "offset, base", [(-1, "a\nb"), (0, "a\nB")], ids=["old-version", "other-base"]
+)
+def test_conflict_leaves_the_captcha_unspent(app, client, monkeypatch, offset, base):
+    verifier = RecordingVerifier()
+    monkeypatch.setattr(personal_space, "captcha_verifier", verifier)
+    version = set_note(app, client.username, "a\nb")
+
+    assert patch(client, version + offset, base, "a\nc").status_code == 409
+    assert verifier.tokens == []
+    assert patch(client, version, "a\nb", "a\nc").status_code == 200
+    assert verifier.tokens == ["x"]
+
+
+def test_captcha_time_is_reported(client):
+    timed = []
+
+    def record(sender, operation, seconds):
+        timed.append(operation)
+
+    with operation_timed.connected_to(record, personal_space.app):
+        response = client.post(
+            "/space/update", data={"content": "n", "h-captcha-response": "x"}
+        )
+
+    assert timed == ["captcha"]
+    assert response.headers["Server-Timing"].startswith("captcha;dur=")
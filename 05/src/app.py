@@ -1,43 +1,62 @@
 import asyncio
+import fcntl
+import functools
+import io
 import json
 import lzma
+import mmap
 import os
+import struct
+import tarfile
 import threading
-from datetime import datetime
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
 
-import yaml
-from argon2 import PasswordHasher
+import pitfalls_core
 from flask import (
-    Flask,
+    Response,
     abort,
     flash,
+    jsonify,
     redirect,
     render_template,
     request,
-    session,
+    stream_with_context,
     url_for,
 )
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text
-from sqlalchemy.pool import StaticPool
+from pitfalls_core import UserMixin, db, init_db, require_admin, require_login
+from sqlalchemy import Column, DateTime, Integer, LargeBinary, func, select
+from sqlalchemy.types import TypeDecorator
+from werkzeug.exceptions import HTTPException
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
 
 # ------------------------------------------------------------
 # App setup
 # ------------------------------------------------------------
 
-ph = PasswordHasher()
-
-app = Flask(__name__)
-app.secret_key = os.environ.get("SECRET_KEY", os.urandom(64))
-app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "poolclass": StaticPool,
-    "connect_args": {"check_same_thread": False},
-}
-
-db = SQLAlchemy()
-db.init_app(app)
+app = pitfalls_core.create_app(
+    __name__,
+    {
+        "AUTH_HOME": "converter",
+        # Per document; nodes count every alias as a copy of its target
+        "YAML_MAX_NODES": int(os.environ.get("YAML_MAX_NODES", 250_000)),
+        "YAML_MAX_ALIASES": int(os.environ.get("YAML_MAX_ALIASES", 1_000)),
+        "YAML_MAX_DEPTH": int(os.environ.get("YAML_MAX_DEPTH", 100)),
+        "YAML_MAX_SECONDS": float(os.environ.get("YAML_MAX_SECONDS", 10.0)),
+        # Request bodies (413 past it) and the YAML an /import decompresses to
+        "MAX_CONTENT_LENGTH": int(os.environ.get("MAX_UPLOAD_BYTES", 16 * 2**20)),
+        "IMPORT_MAX_YAML_BYTES": int(
+            os.environ.get("IMPORT_MAX_YAML_BYTES", 64 * 2**20)
+        ),
+        # zlib level for stored conversions: 1 is fastest, 9 smallest
+        "CONVERSION_COMPRESS_LEVEL": int(
+            os.environ.get("CONVERSION_COMPRESS_LEVEL", 6)
+        ),
+    },
+)
+app.config["RATELIMIT_ROUTES"]["convert"] = "write"
 
 # ------------------------------------------------------------
 # Global State
@@ -45,30 +64,111 @@ db.init_app(app)
 
 
 class GlobalState:
+    """
+    Converter settings shared by every server worker.
+
+    The state lives in a small memory-mapped file (GLOBAL_STATE_PATH) that
+    starts with a version counter. Writers hold a file lock, make the counter
+    odd while they rewrite the state and even again when done. Readers only
+    compare the counter with the version they last decoded, so a change made
+    by one worker is seen by the others on their next access, without a lock
+    or a read from disk. Until attach() is called the state is per process.
+
+    A new state file starts out with DEFAULTS. Attaching to one that has
+    been written keeps what is in it, so a worker that starts (or restarts)
+    does not undo the settings the others are using.
+    """
+
+    SIZE = 4096
+    HEADER = struct.Struct("<QI")  # version, length of the JSON state
+    DEFAULTS = {"safe_mode": True, "import_in_progress": False}
+
     def __init__(self):
         self._state = {}
         self._lock = threading.Lock()
+        self._path = None
+        self._map = None
+        self._version = 0
 
-    def get_safe_mode(self):
+    def attach(self, path):
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.SIZE:
+                os.ftruncate(fd, self.SIZE)
+            self._map = mmap.mmap(fd, self.SIZE)
+        finally:
+            os.close(fd)
+        self._path = path
+        self._version = -1
+        with self._locked():
+            if self.HEADER.unpack_from(self._map)[0] == 0:
+                self._write(dict(self.DEFAULTS))
+
+    @contextmanager
+    def _locked(self):
         with self._lock:
-            return self._state.get("safe_mode")
+            if self._map is None:
+                yield
+                return
+            with open(self._path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+
+    def _decode(self):
+        version, length = self.HEADER.unpack_from(self._map)
+        if version == self._version or version % 2:
+            return version
+        payload = self._map[self.HEADER.size : self.HEADER.size + length]
+        if self.HEADER.unpack_from(self._map)[0] != version:
+            return version + 1
+        self._state = json.loads(payload) if length else {}
+        self._version = version
+        return version
+
+    def _current(self):
+        if self._map is not None and self._decode() % 2:
+            # A write is in progress; it finishes before the lock is released
+            with self._locked():
+                return self._latest()
+        return self._state
+
+    def _latest(self):
+        # Callers hold _locked(), so no other write is in progress
+        if self._map is not None:
+            self._decode()
+        return self._state
+
+    def _write(self, state):
+        # Callers hold _locked()
+        if self._map is None:
+            self._state = state
+            return
+        payload = json.dumps(state).encode()
+        if self.HEADER.size + len(payload) > self.SIZE:
+            raise ValueError("global state does not fit its file")
+        version = self.HEADER.unpack_from(self._map)[0] | 1
+        self.HEADER.pack_into(self._map, 0, version, len(payload))
+        self._map[self.HEADER.size : self.HEADER.size + len(payload)] = payload
+        self.HEADER.pack_into(self._map, 0, version + 1, len(payload))
+        self._state, self._version = state, version + 1
+
+    def get_safe_mode(self):
+        return self._current().get("safe_mode")
 
     def set_safe_mode(self, value):
-        with self._lock:
-            self._state["safe_mode"] = value
+        with self._locked():
+            self._write({**self._latest(), "safe_mode": value})
 
     def ensure_defaults(self):
-        with self._lock:
-            self._state["safe_mode"] = True
-            self._state["import_in_progress"] = False
+        with self._locked():
+            self._write({**self._latest(), **self.DEFAULTS})
 
     def update(self, state):
-        with self._lock:
-            self._state = state
+        with self._locked():
+            self._write(state)
 
     def get(self, name):
-        with self._lock:
-            return self._state.get(name)
+        return self._current().get(name)
 
     @property
     def lock(self):
@@ -83,20 +183,92 @@ gs = GlobalState()
 # ------------------------------------------------------------
 
 
-class User(db.Model):
+class User(UserMixin, db.Model):
     __tablename__ = "users"
-    id = Column(Integer, primary_key=True)
-    username = Column(String(64), unique=True, nullable=False, index=True)
-    password_hash = Column(String(256), nullable=False)
-    is_admin = Column(Boolean, default=False)
+
+
+class StorageStats:
+    """Bytes and time spent compressing and decompressing stored text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.written = {"values": 0, "raw_bytes": 0, "stored_bytes": 0, "seconds": 0.0}
+        self.read = {"values": 0, "raw_bytes": 0, "seconds": 0.0}
+
+    def record(self, counters, seconds, raw_bytes, stored_bytes=None):
+        with self._lock:
+            counters["values"] += 1
+            counters["raw_bytes"] += raw_bytes
+            counters["seconds"] += seconds
+            if stored_bytes is not None:
+                counters["stored_bytes"] += stored_bytes
+
+    def report(self):
+        with self._lock:
+            written, read = dict(self.written), dict(self.read)
+        for counters in (written, read):
+            megabytes = counters["raw_bytes"] / 2**20
+            counters["ms_per_mb"] = (
+                counters["seconds"] * 1000 / megabytes if megabytes else 0.0
+            )
+        written["saved_bytes"] = written["raw_bytes"] - written["stored_bytes"]
+        return {"written": written, "read": read}
+
+
+storage_stats = StorageStats()
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text stored zlib-compressed, decompressed again when it is loaded.
+
+    The first byte of the stored value says how the rest is stored: b"z" for
+    zlib, b"t" for plain UTF-8 (short values, and values that would not get
+    any smaller).
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+    min_bytes = 256
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        started = time.perf_counter()
+        raw = value.encode()
+        stored = b"t" + raw
+        if len(raw) >= self.min_bytes:
+            compressed = zlib.compress(raw, app.config["CONVERSION_COMPRESS_LEVEL"])
+            if len(compressed) < len(raw):
+                stored = b"z" + compressed
+        storage_stats.record(
+            storage_stats.written,
+            time.perf_counter() - started,
+            len(raw),
+            len(stored),
+        )
+        return stored
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        started = time.perf_counter()
+        if value[:1] == b"z":
+            raw = zlib.decompress(value[1:])
+        else:
+            raw = value[1:]
+        storage_stats.record(
+            storage_stats.read, time.perf_counter() - started, len(raw)
+        )
+        return raw.decode()
 
 
 class Conversion(db.Model):
     __tablename__ = "conversions"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, nullable=False)
-    yaml_input = Column(Text, nullable=False)
-    json_output = Column(Text, nullable=False)
+    yaml_input = Column(CompressedText, nullable=False)
+    json_output = Column(CompressedText, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -105,104 +277,287 @@ class Conversion(db.Model):
 # ------------------------------------------------------------
 
 
-def get_current_user():
-    user_id = session.get("user_id")
-    if user_id:
-        return db.session.get(User, user_id)
-    return None
-
-
-@app.context_processor
-def inject_user():
-    return dict(current_user=get_current_user(), safe_mode=gs.get_safe_mode())
+class YAMLLimitError(ValueError):
+    pass
+
+
+@functools.cache
+def bounded_loader(safe):
+    """
+    PyYAML loader that gives up on a document as soon as it goes over one of
+    the YAML_MAX_* limits.
+
+    Aliases are counted at the size of the node they refer to, since that is
+    how big the document gets once json.dumps writes it out; a few kilobytes
+    of nested anchors would otherwise expand to gigabytes. Time is checked
+    between nodes.
+    """
+    # PyYAML is only needed once somebody converts something
+    import yaml
+    from yaml.events import AliasEvent
+
+    class BoundedLoader(yaml.SafeLoader if safe else yaml.Loader):
+        def __init__(self, stream, config):
+            super().__init__(stream)
+            self.max_nodes = config["YAML_MAX_NODES"]
+            self.max_aliases = config["YAML_MAX_ALIASES"]
+            self.max_depth = config["YAML_MAX_DEPTH"]
+            self.max_seconds = config["YAML_MAX_SECONDS"]
+            self.deadline = time.monotonic() + self.max_seconds
+            self.nodes = self.aliases = self.depth = 0
+            # Anchor -> nodes its subtree expands to
+            self.sizes = {}
+
+        def check_time(self):
+            if time.monotonic() > self.deadline:
+                raise YAMLLimitError(
+                    f"YAML document took longer than {self.max_seconds}s to load"
+                )
+
+        def add_nodes(self, count):
+            self.nodes += count
+            if self.nodes > self.max_nodes:
+                raise YAMLLimitError(
+                    f"YAML document has more than {self.max_nodes} nodes"
+                    " with aliases expanded"
+                )
+
+        def compose_node(self, parent, index):
+            self.check_time()
+            anchor = self.peek_event().anchor
+
+            if self.check_event(AliasEvent):
+                self.aliases += 1
+                if self.aliases > self.max_aliases:
+                    raise YAMLLimitError(
+                        f"YAML document has more than {self.max_aliases} aliases"
+                    )
+                # An alias of a node still being composed is recursive and
+                # refers back to itself, which json.dumps rejects anyway
+                self.add_nodes(self.sizes.get(anchor, 1))
+                return super().compose_node(parent, index)
+
+            self.depth += 1
+            if self.depth > self.max_depth:
+                raise YAMLLimitError(
+                    f"YAML document is nested deeper than {self.max_depth} levels"
+                )
+            start = self.nodes
+            self.add_nodes(1)
+            node = super().compose_node(parent, index)
+            self.depth -= 1
+            if anchor is not None:
+                self.sizes[anchor] = self.nodes - start
+            return node
+
+        def construct_object(self, node, deep=False):
+            self.check_time()
+            return super().construct_object(node, deep)
+
+    return BoundedLoader
+
+
+def load_yaml(text, safe=True):
+    loader = bounded_loader(safe)(text, app.config)
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
 
 
-def require_login():
-    user = get_current_user()
-    if not user:
-        flash("Please log in first.", "danger")
-        abort(403)
-    return user
+EXPORT_BATCH_SIZE = 100
+# xz preset 1 needs a tenth of the memory of the default 6
+EXPORT_XZ_PRESET = 1
+SQLITE_MAX_INTEGER = 2**63 - 1
 
 
-def require_admin():
-    user = get_current_user()
-    if not user or not user.is_admin:
-        abort(403)
-    return user
+def parse_since(value):
+    """`since` is the last conversion id already exported, or a timestamp."""
+    if not value:
+        return None
+    # isdigit() also takes "²", which int() does not
+    if value.isdecimal():
+        try:
+            last_id = int(value)
+        except ValueError:
+            # More digits than int() converts
+            abort(400, "since is not a valid conversion id")
+        # SQLite cannot bind anything larger, and no id is past it anyway
+        return min(last_id, SQLITE_MAX_INTEGER)
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, "since must be a conversion id or an ISO 8601 timestamp")
+    # created_at is naive UTC
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def iter_conversions(user_id, since=None):
+    """
+    Yields the user's conversions in id order, one batch of rows at a time.
+
+    Each batch is a short query continuing after the last id of the one
+    before, rather than a cursor held open for the whole export on the
+    SQLite connection every request shares.
+    """
+    query = select(
+        Conversion.id,
+        Conversion.created_at,
+        Conversion.yaml_input,
+        Conversion.json_output,
+    ).where(Conversion.user_id == user_id)
+    last_id = 0
+    if isinstance(since, int):
+        last_id = since
+    elif since is not None:
+        query = query.where(Conversion.created_at > since)
+
+    while True:
+        rows = db.session.execute(
+            query.where(Conversion.id > last_id)
+            .order_by(Conversion.id)
+            .limit(EXPORT_BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1].id
+
+
+def export_ndjson(rows):
+    for row in rows:
+        record = {
+            "id": row.id,
+            "created_at": row.created_at.isoformat(),
+            "yaml_input": row.yaml_input,
+            "json_output": row.json_output,
+        }
+        yield json.dumps(record) + "\n"
+
+
+class ChunkBuffer:
+    """Write-only file that hands back what was written since the last drain()."""
 
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_tar_xz(rows):
+    # tarfile's own "w|xz" compresses every small write at the default preset;
+    # compressing the plain tar stream once per row is several times faster
+    buffer = ChunkBuffer()
+    compressor = lzma.LZMACompressor(preset=EXPORT_XZ_PRESET)
+    with tarfile.open(fileobj=buffer, mode="w|") as tar:
+        for row in rows:
+            mtime = int(row.created_at.replace(tzinfo=timezone.utc).timestamp())
+            for suffix, text in ((".yaml", row.yaml_input), (".json", row.json_output)):
+                data = text.encode()
+                info = tarfile.TarInfo(f"conversions/{row.id}{suffix}")
+                info.size = len(data)
+                info.mtime = mtime
+                tar.addfile(info, io.BytesIO(data))
+            if chunk := compressor.compress(buffer.drain()):
+                yield chunk
+    yield compressor.compress(buffer.drain()) + compressor.flush()
+
+
+EXPORT_FORMATS = {
+    "ndjson": (export_ndjson, "application/x-ndjson", "conversions.ndjson"),
+    "tar.xz": (export_tar_xz, "application/x-xz", "conversions.tar.xz"),
+}
 
-# ------------------------------------------------------------
-# Routes
-# ------------------------------------------------------------
 
+class ImportUpload:
+    """
+    An /import request body, read from the request stream as it arrives.
 
-@app.route("/")
-def index():
-    # TODO: add warning about degraded performance when some import is in progress
-    return render_template("index.html")
+    Multipart parts are decoded incrementally and the "file" part goes
+    straight into an LZMA decompressor, so the upload is never buffered
+    whole or spooled to a temporary file. The body itself is capped by
+    MAX_CONTENT_LENGTH (Werkzeug stops reading there, or before reading at
+    all when Content-Length is too big); the decompressed YAML is capped by
+    IMPORT_MAX_YAML_BYTES, checked after every chunk.
+    """
 
+    chunk_size = 64 * 1024
 
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
-
-        if not username or not password:
-            flash("Username and password are required", "danger")
-            return redirect(url_for("register"))
-
-        existing_user = db.session.query(User).filter_by(username=username).first()
-        if existing_user:
-            flash("Username already exists", "danger")
-            return redirect(url_for("register"))
-
-        user = User(
-            username=username,
-            password_hash=ph.hash(password),
-            is_admin=False,
+    def __init__(self, stream, boundary, max_bytes):
+        self.stream = stream
+        self.decoder = MultipartDecoder(
+            boundary.encode(), app.config["MAX_FORM_MEMORY_SIZE"], max_parts=16
         )
-        db.session.add(user)
-        db.session.commit()
-
-        flash("Registration successful! Please log in.", "success")
-        return redirect(url_for("login"))
+        self.max_bytes = max_bytes
+        self.events = self._events()
+
+    def _events(self):
+        while True:
+            event = self.decoder.next_event()
+            if isinstance(event, NeedData):
+                self.decoder.receive_data(self.stream.read(self.chunk_size) or None)
+            elif isinstance(event, Epilogue):
+                return
+            else:
+                yield event
+
+    def open_file(self):
+        """Read up to the "file" part and return its filename (None if missing)."""
+        for event in self.events:
+            if isinstance(event, File) and event.name == "file":
+                return event.filename
+        return None
+
+    def read_file(self):
+        """Decompress the "file" part as it is read and return the result."""
+        decompressor = lzma.LZMADecompressor()
+        chunks, size = [], 0
+        for event in self.events:
+            if not isinstance(event, Data):
+                break
+            data = event.data
+            # Anything after the end of the .xz stream is ignored
+            while not decompressor.eof and (data or not decompressor.needs_input):
+                chunk = decompressor.decompress(data, self.max_bytes - size + 1)
+                data = b""
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ValueError(
+                        f"file decompresses to more than {self.max_bytes} bytes"
+                    )
+                chunks.append(chunk)
+            if not event.more_data:
+                break
+        if not decompressor.eof:
+            raise lzma.LZMAError(
+                "Compressed data ended before the end-of-stream marker was reached"
+            )
+        return b"".join(chunks)
 
-    return render_template("register.html")
 
+@app.context_processor
+def inject_safe_mode():
+    return dict(safe_mode=gs.get_safe_mode())
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    if request.method == "POST":
-        username = request.form.get("username", "").strip()
-        password = request.form.get("password", "").strip()
-
-        user = db.session.query(User).filter_by(username=username).first()
-
-        if not user:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
-
-        try:
-            ph.verify(user.password_hash, password)
-        except Exception:
-            flash("Invalid username or password", "danger")
-            return redirect(url_for("login"))
-
-        session["user_id"] = user.id
-        session["username"] = user.username
-        flash(f"Welcome back, {user.username}!", "success")
-        return redirect(url_for("converter"))
 
-    return render_template("login.html")
+# ------------------------------------------------------------
+# Routes
+# ------------------------------------------------------------
 
 
-@app.route("/logout")
-def logout():
-    session.clear()
-    flash("You have been logged out", "info")
-    return redirect(url_for("index"))
+@app.route("/")
+def index():
+    # TODO: add warning about degraded performance when some import is in progress
+    return render_template("index.html")
 
 
 @app.route("/converter")
@@ -232,10 +587,7 @@ def convert():
     try:
         current_mode = gs.get_safe_mode()
 
-        if current_mode:
-            parsed = yaml.safe_load(yaml_input)
-        else:
-            parsed = yaml.load(yaml_input, Loader=yaml.Loader)
+        parsed = load_yaml(yaml_input, safe=bool(current_mode))
 
         json_output = json.dumps(parsed, indent=2)
 
@@ -272,6 +624,29 @@ def admin_config():
     return render_template("admin_config.html")
 
 
+@app.route("/admin/storage")
+def admin_storage():
+    require_admin()
+
+    rows, stored_bytes = db.session.query(
+        func.count(Conversion.id),
+        func.coalesce(
+            func.sum(
+                func.length(Conversion.yaml_input) + func.length(Conversion.json_output)
+            ),
+            0,
+        ),
+    ).one()
+
+    # Counters cover this process since it started, like its database
+    return jsonify(
+        conversions=rows,
+        stored_bytes=stored_bytes,
+        compress_level=app.config["CONVERSION_COMPRESS_LEVEL"],
+        **storage_stats.report(),
+    )
+
+
 @app.route("/import", methods=["GET", "POST"])
 async def import_conversions():
     current_user = require_login()
@@ -279,30 +654,38 @@ async def import_conversions():
     if request.method == "GET":
         return render_template("import.html")
 
-    if "file" not in request.files:
+    # The body is parsed here, as it streams in, instead of by request.files
+    boundary = request.mimetype_params.get("boundary")
+    filename = None
+    if request.mimetype == "multipart/form-data" and boundary:
+        upload = ImportUpload(
+            request.stream, boundary, app.config["IMPORT_MAX_YAML_BYTES"]
+        )
+        try:
+            filename = await asyncio.to_thread(upload.open_file)
+        except ValueError:
+            pass
+
+    if filename is None:
         flash("No file uploaded", "danger")
         return redirect(url_for("import_conversions"))
 
-    file = request.files["file"]
-
-    if file.filename == "":
+    if filename == "":
         flash("No file selected", "danger")
         return redirect(url_for("import_conversions"))
 
-    if not file.filename.endswith(".yaml.xz"):
+    if not filename.endswith(".yaml.xz"):
         flash("Please upload a .yaml.xz file (LZMA compressed YAML)", "danger")
         return redirect(url_for("import_conversions"))
 
     try:
-        compressed_data = file.read()
-
         gs.update({"import_in_progress": True})
 
-        decompressed_data = await asyncio.to_thread(lzma.decompress, compressed_data)
+        decompressed_data = await asyncio.to_thread(upload.read_file)
 
         yaml_content = decompressed_data.decode("utf-8")
 
-        parsed = yaml.safe_load(yaml_content)
+        parsed = load_yaml(yaml_content)
         json_output = json.dumps(parsed, indent=2)
 
         conversion = Conversion(
@@ -316,6 +699,9 @@ async def import_conversions():
         flash("Import successful!", "success")
     except lzma.LZMAError as e:
         flash(f"Decompression failed: {str(e)}", "danger")
+    except HTTPException:
+        # An upload over MAX_CONTENT_LENGTH is answered with 413, not flashed
+        raise
     except Exception as e:
         flash(f"Import failed: {str(e)}", "danger")
     finally:
@@ -338,30 +724,26 @@ def history():
     return render_template("history.html", conversions=conversions)
 
 
-@app.route("/health")
-def health():
-    return "OK"
-
-
-# ------------------------------------------------------------
-# Database initialization
-# ------------------------------------------------------------
+@app.route("/history/export")
+def export_history():
+    current_user = require_login()
 
+    format = request.args.get("format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        abort(400, f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    export, mimetype, filename = EXPORT_FORMATS[format]
+    rows = iter_conversions(current_user.id, parse_since(request.args.get("since")))
 
-def init_db():
-    with app.app_context():
-        db.create_all()
+    return Response(
+        stream_with_context(export(rows)),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
 
-        admin_password = os.environ.get("ADMIN_PASSWORD")
 
-        admin = User(
-            username="admin",
-            password_hash=ph.hash(admin_password),
-            is_admin=True,
-        )
-        db.session.add(admin)
-
-        db.session.commit()
+@app.route("/health")
+def health():
+    return "OK"
 
 
 # ------------------------------------------------------------
@@ -370,6 +752,6 @@ def init_db():
 
 
 def create_app():
-    init_db()
-    gs.ensure_defaults()
-    return app
+    init_db(app)
+    gs.attach(os.environ.get("GLOBAL_STATE_PATH", "global_state.mmap"))
+    return pitfalls_core.ready(app)
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+os.environ.setdefault("RATELIMIT_ENABLED", "0")
+os.environ.setdefault("ADMIN_PASSWORD", "admin")
+
+import app as converter  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    # create_app() seeds the admin account, so it runs once per session
+    state = tmp_path_factory.mktemp("state") / "global_state.mmap"
+    os.environ["GLOBAL_STATE_PATH"] = str(state)
+    return converter.create_app()
+
+
+def logged_in(app, account):
+    client = app.test_client()
+    client.post("/login", data=account)
+    client.username = account["username"]
+    return client
+
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as a new user of its own (client.username)."""
+    account = {"username": f"user{os.urandom(4).hex()}", "password": "pw"}
+    app.test_client().post("/register", data=account)
+    return logged_in(app, account)
+
+
+@pytest.fixture
+def admin(app):
+    """A test client logged in as the seeded admin."""
+    return logged_in(
+        app, {"username": "admin", "password": os.environ["ADMIN_PASSWORD"]}
+    )
@@ -0,0 +1,86 @@
+import os
+import threading
+
+import pytest
+
+from app import GlobalState
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "global_state.mmap")
+
+
+def attached(path):
+    state = GlobalState()
+    state.attach(path)
+    return state
+
+
+def test_new_file_starts_with_the_defaults(path):
+    state = attached(path)
+
+    assert state.get_safe_mode() is True
+    assert state.get("import_in_progress") is False
+
+
+def test_second_attach_keeps_the_state(path):
+    attached(path).set_safe_mode(False)
+
+    assert attached(path).get_safe_mode() is False
+
+
+def test_write_is_seen_by_the_other_workers(path):
+    first, second = attached(path), attached(path)
+    assert second.get_safe_mode() is True
+
+    first.update({"safe_mode": False, "parser": "unsafe"})
+    assert second.get_safe_mode() is False
+    assert second.get("parser") == "unsafe"
+
+    pid = os.fork()
+    if pid == 0:
+        attached(path).set_safe_mode(True)
+        os._exit(0)
+    os.waitpid(pid, 0)
+    assert first.get_safe_mode() is True
+    assert first.get("parser") == "unsafe"
+
+
+def test_read_during_a_write_waits_for_it(path):
+    writer, reader = attached(path), attached(path)
+    seen = []
+    with writer._locked():
+        # Half way through a write: the version is odd, the payload stale
+        version, length = writer.HEADER.unpack_from(writer._map)
+        writer.HEADER.pack_into(writer._map, 0, version + 1, length)
+        thread = threading.Thread(target=lambda: seen.append(reader.get("n")))
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+        writer._write({"n": 1})
+    thread.join(5)
+
+    assert seen == [1]
+
+
+def test_reads_never_see_a_torn_write(path):
+    reader = attached(path)
+    pid = os.fork()
+    if pid == 0:
+        writer = attached(path)
+        for n in range(1, 2001):
+            writer.update({"n": n, "pad": "x" * (n % 500)})
+        os._exit(0)
+
+    seen = []
+    exited = 0
+    while not exited:
+        exited, _ = os.waitpid(pid, os.WNOHANG)
+        state = reader._current()
+        if "n" in state:
+            assert state["pad"] == "x" * (state["n"] % 500)
+            seen.append(state["n"])
+
+    assert seen == sorted(seen)
+    assert seen[-1] == 2000
@@ -0,0 +1,42 @@
+import io
+import lzma
+import os
+
+import pytest
+
+import app as converter
+
+BOUNDARY = "importboundary"
+
+
+def upload(client, data):
+    head = (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="file"; filename="a.yaml.xz"\r\n'
+        "Content-Type: application/x-xz\r\n\r\n"
+    )
+    body = head.encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+    # No Content-Length, as with a chunked upload: the body is only found to
+    # be too large while it is being read
+    return client.post(
+        "/import",
+        input_stream=io.BytesIO(body),
+        content_type=f"multipart/form-data; boundary={BOUNDARY}",
+        headers={"Transfer-Encoding": "chunked"},
+        environ_overrides={"wsgi.input_terminated": True},
+    )
+
+
+def test_import(client):
+    response = upload(client, lzma.compress(b"a: 1\n"))
+
+    assert response.status_code == 302
+    assert "a: 1" in client.get("/history").text
+
+
+def test_body_over_max_content_length_is_413(client, monkeypatch):
+    monkeypatch.setitem(converter.app.config, "MAX_CONTENT_LENGTH", 100_000)
+    data = lzma.compress(os.urandom(300_000), preset=0)
+
+    assert upload(client, data).status_code == 413
+    assert not converter.gs.get("import_in_progress")
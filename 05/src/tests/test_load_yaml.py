@@ -0,0 +1,58 @@
+import pytest
+
+from app import YAMLLimitError, load_yaml
+
+# Nine levels of nine aliases: a few hundred bytes that expand to 9**9 nodes
+BILLION_LAUGHS = "a: &a [lol, lol, lol, lol, lol, lol, lol, lol, lol]\n" + "".join(
+    f"{name}: &{name} [{', '.join([f'*{prev}'] * 9)}]\n"
+    for prev, name in zip("abcdefgh", "bcdefghi")
+)
+
+NORMAL = """\
+name: demo
+tags: [a, b]
+defaults: &defaults {retries: 3}
+job:
+  <<: *defaults
+  steps:
+    - build
+    - test
+"""
+
+
+@pytest.mark.parametrize("safe", [True, False], ids=["safe", "unsafe"])
+def test_normal_document_loads(safe):
+    assert load_yaml(NORMAL, safe=safe) == {
+        "name": "demo",
+        "tags": ["a", "b"],
+        "defaults": {"retries": 3},
+        "job": {"retries": 3, "steps": ["build", "test"]},
+    }
+
+
+@pytest.mark.parametrize("safe", [True, False], ids=["safe", "unsafe"])
+def test_billion_laughs_is_rejected(safe):
+    with pytest.raises(YAMLLimitError, match="nodes"):
+        load_yaml(BILLION_LAUGHS, safe=safe)
+
+
+@pytest.mark.parametrize("safe", [True, False], ids=["safe", "unsafe"])
+def test_deep_nesting_is_rejected(safe):
+    with pytest.raises(YAMLLimitError, match="nested deeper"):
+        load_yaml("[" * 5000 + "]" * 5000, safe=safe)
+
+
+def test_too_many_aliases_are_rejected():
+    document = "a: &a 1\nb: [" + ", ".join(["*a"] * 2000) + "]\n"
+
+    with pytest.raises(YAMLLimitError, match="aliases"):
+        load_yaml(document)
+
+
+def test_convert_reports_the_limit(client):
+    response = client.post(
+        "/convert", data={"yaml_input": BILLION_LAUGHS}, follow_redirects=True
+    )
+
+    assert response.status_code == 200
+    assert "Conversion failed: YAML document has more than" in response.text
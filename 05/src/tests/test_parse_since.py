@@ -0,0 +1,56 @@
+import json
+from datetime import datetime
+
+import pytest
+from werkzeug.exceptions import BadRequest
+
+from app import SQLITE_MAX_INTEGER, parse_since
+
+TOO_LONG = pytest.param("9" * 5000, id="more-digits-than-int-reads")
+
+
+@pytest.mark.parametrize("value", [None, ""])
+def test_no_since(value):
+    assert parse_since(value) is None
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("0", 0), ("42", 42), ("٤٢", 42), ("9" * 30, SQLITE_MAX_INTEGER)],
+    ids=["zero", "ascii", "arabic-indic", "past-sqlite-max"],
+)
+def test_conversion_id(value, expected):
+    assert parse_since(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2024-05-01T12:00:00", datetime(2024, 5, 1, 12)),
+        ("2024-05-01T14:00:00+02:00", datetime(2024, 5, 1, 12)),
+    ],
+)
+def test_timestamp_is_naive_utc(value, expected):
+    assert parse_since(value) == expected
+
+
+@pytest.mark.parametrize("value", ["²", "1²", "-1", "yesterday", TOO_LONG])
+def test_anything_else_is_a_bad_request(value):
+    with pytest.raises(BadRequest):
+        parse_since(value)
+
+
+def export(client, since):
+    return client.get("/history/export", query_string={"since": since})
+
+
+def test_export_since(client):
+    client.post("/convert", data={"yaml_input": "a: 1"})
+    rows = export(client, "0").text.splitlines()
+    assert [json.loads(row)["json_output"] for row in rows] == ['{\n  "a": 1\n}']
+    assert export(client, "9" * 30).text == ""
+
+
+@pytest.mark.parametrize("since", ["²", TOO_LONG])
+def test_export_rejects_bad_since(client, since):
+    assert export(client, since).status_code == 400
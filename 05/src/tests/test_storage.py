@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import text
+
+from app import CompressedText, Conversion, db, storage_stats
+
+LONG = "key: value\n" * 100
+
+
+def stored(conversion_id):
+    return db.session.execute(
+        text("SELECT yaml_input, json_output FROM conversions WHERE id = :id"),
+        {"id": conversion_id},
+    ).one()
+
+
+@pytest.mark.parametrize(
+    "value, prefix",
+    [("short", b"t"), (LONG, b"z"), ("", b"t"), ("ünïcode " * 64, b"z")],
+    ids=["short", "long", "empty", "unicode"],
+)
+def test_round_trip(value, prefix):
+    column = CompressedText()
+
+    value_stored = column.process_bind_param(value, None)
+
+    assert value_stored[:1] == prefix
+    assert column.process_result_value(value_stored, None) == value
+
+
+def test_none_stays_none():
+    column = CompressedText()
+
+    assert column.process_bind_param(None, None) is None
+    assert column.process_result_value(None, None) is None
+
+
+def test_rows_are_stored_with_their_prefix(app):
+    with app.app_context():
+        conversion = Conversion(user_id=0, yaml_input=LONG, json_output="{}")
+        db.session.add(conversion)
+        db.session.commit()
+        yaml_input, json_output = stored(conversion.id)
+
+    assert yaml_input[:1] == b"z" and len(yaml_input) < len(LONG)
+    assert json_output == b"t{}"
+
+
+def test_uncompressed_rows_are_read(app):
+    with app.app_context():
+        db.session.execute(
+            text(
+                "INSERT INTO conversions (user_id, yaml_input, json_output)"
+                " VALUES (0, :yaml, :json)"
+            ),
+            {"yaml": b"t" + LONG.encode(), "json": b"t{}"},
+        )
+        conversion = db.session.query(Conversion).order_by(Conversion.id.desc())[0]
+
+        assert conversion.yaml_input == LONG
+        assert conversion.json_output == "{}"
+
+
+def test_storage_report(admin, client):
+    before = storage_stats.report()
+    client.post("/convert", data={"yaml_input": LONG})
+
+    report = admin.get("/admin/storage").get_json()
+
+    written = report["written"]
+    assert written["values"] == before["written"]["values"] + 2
+    assert written["raw_bytes"] > before["written"]["raw_bytes"] + len(LONG)
+    assert written["saved_bytes"] > before["written"]["saved_bytes"]
+    assert written["saved_bytes"] == written["raw_bytes"] - written["stored_bytes"]
+    assert report["conversions"] >= 1
+    assert report["stored_bytes"] > 0
+    assert {"values", "raw_bytes", "seconds", "ms_per_mb"} <= report["read"].keys()
+
+
+def test_storage_report_is_for_admins(client):
+    assert client.get("/admin/storage").status_code == 403
@@ -0,0 +1,170 @@
+"""
+Benchmark of the converter's YAML loading against adversarial documents.
+
+Loads every document of the corpus the way /convert does in safe mode
+(load, then json.dumps) twice: with plain yaml.SafeLoader and with the
+app's bounded loader, each in a fresh process. For each it reports the
+time, how much the process grew at its peak, the size of the JSON that
+comes out and, for the bounded loader, which limit stopped the document:
+
+    python 05/yamlbench.py
+    python 05/yamlbench.py -d billion_laughs deep_sequence --scale 2
+    python 05/yamlbench.py --max-seconds 1 --json yamlbench.json
+
+The documents are sized so the unbounded run still finishes; --scale makes
+them bigger (the unbounded numbers grow much faster than the input).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def billion_laughs(scale):
+    # Each level is a list of nine aliases of the level below
+    levels = 5 + scale
+    lines = ["l0: &l0 [lol]"]
+    for i in range(1, levels + 1):
+        lines.append(f"l{i}: &l{i} [{', '.join([f'*l{i - 1}'] * 9)}]")
+    return "\n".join(lines)
+
+
+def alias_fanout(scale):
+    # One big anchor referenced many times: quadratic rather than exponential
+    items = ", ".join(str(i) for i in range(500 * scale))
+    refs = ", ".join(["*big"] * 500)
+    return f"big: &big [{items}]\nrefs: [{refs}]"
+
+
+def deep_sequence(scale):
+    depth = 150 * scale
+    return "[" * depth + "]" * depth
+
+
+def deep_mapping(scale):
+    depth = 150 * scale
+    return "{a: " * depth + "1" + "}" * depth
+
+
+def wide_mapping(scale):
+    return "\n".join(f"key{i}: [a, b, {{c: {i}}}]" for i in range(20_000 * scale))
+
+
+def long_scalar(scale):
+    return "0" * (1024 * 1024 * scale)
+
+
+def benign(scale):
+    return "\n".join(
+        f"- {{name: item{i}, tags: [x, y], nested: {{value: {i}}}}}"
+        for i in range(200 * scale)
+    )
+
+
+CORPUS = {
+    "billion_laughs": billion_laughs,
+    "alias_fanout": alias_fanout,
+    "deep_sequence": deep_sequence,
+    "deep_mapping": deep_mapping,
+    "wide_mapping": wide_mapping,
+    "long_scalar": long_scalar,
+    "benign": benign,
+}
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def measure(loader, name, scale, max_seconds):
+    """Runs in its own process, so the peak RSS belongs to this load alone."""
+    import yaml
+
+    from app import app, load_yaml
+
+    if max_seconds is not None:
+        app.config["YAML_MAX_SECONDS"] = max_seconds
+
+    def load(document):
+        if loader == "bounded":
+            return load_yaml(document)
+        return yaml.load(document, Loader=yaml.SafeLoader)
+
+    document = CORPUS[name](scale)
+    before = rss_mb()
+    started = time.perf_counter()
+    try:
+        output = json.dumps(load(document), indent=2)
+        outcome, output_bytes = "ok", len(output)
+        del output
+    except RecursionError:
+        outcome, output_bytes = "RecursionError", 0
+    except Exception as e:
+        outcome, output_bytes = f"{type(e).__name__}: {e}", 0
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "outcome": outcome,
+        "ms": elapsed * 1000,
+        "peak_mb": max(peak - before, 0.0),
+        "output_bytes": output_bytes,
+    }
+
+
+def print_report(name, input_bytes, unbounded, bounded):
+    print(f"== {name}: {input_bytes} bytes in")
+    for label, result in (("unbounded", unbounded), ("bounded", bounded)):
+        print(
+            f"  {label:10} {result['ms']:>10.1f} ms {result['peak_mb']:>9.1f} MB peak"
+            f" {result['output_bytes']:>12} bytes out  {result['outcome']}"
+        )
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-d", "--documents", nargs="+", default=list(CORPUS), choices=CORPUS
+    )
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument(
+        "--max-seconds", type=float, help="override the app's YAML_MAX_SECONDS"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write the report here")
+    args = parser.parse_args()
+
+    os.environ.setdefault("ADMIN_PASSWORD", "admin")
+    sys.path[:0] = [os.path.join(ROOT, "src"), os.path.join(ROOT, "..", "common")]
+
+    reports = {}
+    with ProcessPoolExecutor(
+        1, multiprocessing.get_context("spawn"), max_tasks_per_child=1
+    ) as pool:
+        for name in args.documents:
+            unbounded, bounded = (
+                pool.submit(measure, loader, name, args.scale, args.max_seconds)
+                for loader in ("unbounded", "bounded")
+            )
+            reports[name] = {
+                "input_bytes": len(CORPUS[name](args.scale)),
+                "unbounded": unbounded.result(),
+                "bounded": bounded.result(),
+            }
+            print_report(name, **reports[name])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
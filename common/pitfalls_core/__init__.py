@@ -0,0 +1,57 @@
+"""
+Core shared by the challenge apps that have user accounts (03, 04, 05):
+the application factory, the users table columns, the auth blueprint
+(register, login, logout) and startup profiling.
+
+    app = create_app(__name__, {"AUTH_HOME": "space"})
+
+    class User(UserMixin, db.Model):
+        __tablename__ = "users"
+
+    def create_app():  # the app's gunicorn entry point
+        init_db(app, seed=add_sample_rows)
+        return ready(app)
+
+Set STARTUP_PROFILE=1 to print where each process spent its startup time.
+
+Apps without accounts (00, 01, 02) only use the metrics, compression, health
+checks and conditional responses, and do not need the "accounts" extra; the
+names below are loaded on first access. zstd and brotli compression come with
+the "compression" extra.
+"""
+
+import importlib
+
+from .profiler import startup
+
+_exports = {
+    "UserMixin": "accounts",
+    "db": "accounts",
+    "get_current_user": "accounts",
+    "hash_password": "accounts",
+    "require_admin": "accounts",
+    "require_login": "accounts",
+    "verify_password": "accounts",
+    "auth": "auth",
+    "conditional": "caching",
+    "create_app": "factory",
+    "init_db": "factory",
+    "ready": "factory",
+    "Metrics": "metrics",
+    "RateLimiter": "ratelimit",
+    "ReportQueue": "reports",
+    "Compression": "compression",
+    "TemplateCache": "templates",
+    "Health": "health",
+    "filesystem_probe": "health",
+    "redis_probe": "health",
+    "sqlite_probe": "health",
+}
+
+__all__ = sorted([*_exports, "startup"])
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_exports[name]}", __name__), name)
@@ -0,0 +1,75 @@
+import functools
+
+from flask import abort, flash, session
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import Boolean, Column, Integer, String
+
+db = SQLAlchemy()
+
+
+@functools.cache
+def password_hasher():
+    # argon2 is loaded on first use rather than with the app
+    from argon2 import PasswordHasher
+
+    return PasswordHasher()
+
+
+def hash_password(password):
+    return password_hasher().hash(password)
+
+
+def verify_password(password_hash, password):
+    try:
+        return password_hasher().verify(password_hash, password)
+    except Exception:
+        return False
+
+
+class UserMixin:
+    """
+    Columns every app's users table has. The app declares the model itself,
+    adding its own columns:
+
+        class User(UserMixin, db.Model):
+            __tablename__ = "users"
+    """
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String(64), unique=True, nullable=False, index=True)
+    password_hash = Column(String(256), nullable=False)
+    is_admin = Column(Boolean, default=False)
+
+    # The concrete model, set when the app declares it
+    model = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        UserMixin.model = cls
+
+    @classmethod
+    def new_account(cls, username, password, **fields):
+        fields.setdefault("is_admin", False)
+        return cls(username=username, password_hash=hash_password(password), **fields)
+
+
+def get_current_user():
+    user_id = session.get("user_id")
+    if user_id:
+        return db.session.get(UserMixin.model, user_id)
+    return None
+
+
+def require_login():
+    user = get_current_user()
+    if not user:
+        flash("Please log in first.", "danger")
+        abort(403)
+    return user
+
+
+def require_admin():
+    user = get_current_user()
+    if not user or not user.is_admin:
+        abort(403)
+    return user
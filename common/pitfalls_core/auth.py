@@ -0,0 +1,68 @@
+from flask import (
+    Blueprint,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    session,
+    url_for,
+)
+
+from .accounts import UserMixin, db, verify_password
+
+auth = Blueprint("auth", __name__)
+
+
+@auth.route("/register", methods=["GET", "POST"])
+def register():
+    if request.method == "POST":
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "").strip()
+
+        if not username or not password:
+            flash("Username and password are required", "danger")
+            return redirect(url_for(".register"))
+
+        User = UserMixin.model
+        existing_user = db.session.query(User).filter_by(username=username).first()
+        if existing_user:
+            flash("Username already exists", "danger")
+            return redirect(url_for(".register"))
+
+        user = User.new_account(username, password)
+        db.session.add(user)
+        db.session.commit()
+
+        flash("Registration successful! Please log in.", "success")
+        return redirect(url_for(".login"))
+
+    return render_template("register.html")
+
+
+@auth.route("/login", methods=["GET", "POST"])
+def login():
+    if request.method == "POST":
+        username = request.form.get("username", "").strip()
+        password = request.form.get("password", "").strip()
+
+        User = UserMixin.model
+        user = db.session.query(User).filter_by(username=username).first()
+
+        if not user or not verify_password(user.password_hash, password):
+            flash("Invalid username or password", "danger")
+            return redirect(url_for(".login"))
+
+        session["user_id"] = user.id
+        session["username"] = user.username
+        flash(f"Welcome back, {user.username}!", "success")
+        return redirect(url_for(current_app.config["AUTH_HOME"]))
+
+    return render_template("login.html")
+
+
+@auth.route("/logout")
+def logout():
+    session.clear()
+    flash("You have been logged out", "info")
+    return redirect(url_for("index"))
@@ -0,0 +1,34 @@
+from flask import current_app, make_response, request, session
+
+
+def conditional(etag, render):
+    """
+    Answer with 304 if the client already holds `etag`, otherwise call
+    `render`. If-None-Match is compared weakly, as RFC 9110 asks for GET,
+    so a W/ tag from a proxy that recompressed the page still matches.
+    Pending flash messages always force a render so they are not lost.
+
+    `etag` None means the resource has no version to compare (01's missing
+    notes), so it is always rendered. A render that is not a 200 is sent
+    as it is, without an ETag or caching headers.
+
+    Cache-Control is looked up by endpoint in the CACHE_CONTROL config
+    ("no-cache" for endpoints not listed). The page depends on the session,
+    so the response varies on Cookie.
+    """
+    if (
+        etag is not None
+        and "_flashes" not in session
+        and request.if_none_match.contains_weak(etag)
+    ):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+        if response.status_code != 200:
+            return response
+    if etag is not None:
+        response.set_etag(etag)
+    cache_control = current_app.config.get("CACHE_CONTROL", {})
+    response.headers["Cache-Control"] = cache_control.get(request.endpoint, "no-cache")
+    response.vary.add("Cookie")
+    return response
@@ -0,0 +1,197 @@
+import hashlib
+import importlib.util
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+COMPRESSIBLE_MIMETYPES = frozenset(
+    {
+        "application/javascript",
+        "application/json",
+        "application/x-ndjson",
+        "application/xml",
+        "image/svg+xml",
+        "text/css",
+        "text/html",
+        "text/javascript",
+        "text/plain",
+        "text/xml",
+    }
+)
+
+
+class _Brotli:
+    """brotli.Compressor with the compress()/flush() of zlib's compressobj."""
+
+    def __init__(self, quality):
+        import brotli
+
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.finish()
+
+
+def _gzip(level):
+    return zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def _zstd(level):
+    import zstandard
+
+    return zstandard.ZstdCompressor(level=level).compressobj()
+
+
+# encoding -> (module it needs, compressor factory taking the level)
+CODECS = {
+    "br": ("brotli", _Brotli),
+    "zstd": ("zstandard", _zstd),
+    "gzip": ("zlib", _gzip),
+}
+
+
+class Compression:
+    """
+    Compresses responses with the best encoding the client accepts, in the
+    order of COMPRESS_ENCODINGS (br, zstd, gzip). zstd and br need the
+    "compression" extra; without it only gzip is offered.
+
+    Only 200 responses of a text-like mimetype are touched, and buffered
+    bodies under COMPRESS_MIN_SIZE bytes are left as they are. Streamed
+    (generator) responses are compressed chunk by chunk as they are sent.
+
+    Compressed bodies of responses with an ETag are kept in a small LRU
+    cache, COMPRESS_CACHE_SIZE entries and COMPRESS_CACHE_BYTES in total,
+    so a page that renders the same again is not compressed twice. An ETag
+    is not trusted on its own (a flashed message changes the page but not
+    the tag): a hit also needs the same digest of the uncompressed body.
+    The ETag of a compressed response is made weak, as it no longer
+    describes the exact bytes sent.
+
+    Set COMPRESS_ENABLED=0 to turn it off.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        # (etag, encoding) -> (digest of the uncompressed body,
+        #                      compressed body)
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self.hits = self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "COMPRESS_ENABLED", os.environ.get("COMPRESS_ENABLED", "1") == "1"
+        )
+        app.config.setdefault("COMPRESS_ENCODINGS", ("br", "zstd", "gzip"))
+        app.config.setdefault("COMPRESS_LEVELS", {"zstd": 3, "br": 4, "gzip": 6})
+        app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESS_MIMETYPES", COMPRESSIBLE_MIMETYPES)
+        app.config.setdefault("COMPRESS_CACHE_SIZE", 128)
+        app.config.setdefault("COMPRESS_CACHE_BYTES", 8 * 2**20)
+        if not app.config["COMPRESS_ENABLED"]:
+            return
+
+        self.config = app.config
+        self.encodings = [
+            encoding
+            for encoding in app.config["COMPRESS_ENCODINGS"]
+            if importlib.util.find_spec(CODECS[encoding][0]) is not None
+        ]
+        app.extensions["compression"] = self
+        app.after_request(self._after_request)
+
+    def compressor(self, encoding):
+        return CODECS[encoding][1](self.config["COMPRESS_LEVELS"][encoding])
+
+    def _compressible(self, response):
+        return (
+            response.status_code == 200
+            and not response.direct_passthrough
+            and "Content-Encoding" not in response.headers
+            and "no-transform" not in response.headers.get("Cache-Control", "")
+            and response.mimetype in self.config["COMPRESS_MIMETYPES"]
+        )
+
+    def _after_request(self, response):
+        if not self._compressible(response):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            original = response.response
+            response.response = self._stream(
+                response.iter_encoded(), original, encoding
+            )
+            response.headers.pop("Content-Length", None)
+        else:
+            body = response.get_data()
+            if len(body) < self.config["COMPRESS_MIN_SIZE"]:
+                return response
+            response.set_data(self._compress(body, encoding, response.get_etag()[0]))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _stream(self, chunks, original, encoding):
+        # Closing this generator (the server does when the client goes
+        # away) closes the app's iterable too
+        compressor = self.compressor(encoding)
+        try:
+            for chunk in chunks:
+                data = compressor.compress(chunk)
+                if data:
+                    yield data
+            yield compressor.flush()
+        finally:
+            if hasattr(original, "close"):
+                original.close()
+
+    def _compress(self, body, encoding, etag):
+        if etag is None or not self.config["COMPRESS_CACHE_SIZE"]:
+            compressor = self.compressor(encoding)
+            return compressor.compress(body) + compressor.flush()
+
+        key = (etag, encoding)
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == digest:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        compressor = self.compressor(encoding)
+        compressed = compressor.compress(body) + compressor.flush()
+        if len(compressed) > self.config["COMPRESS_CACHE_BYTES"]:
+            return compressed
+
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous[1])
+            self._cache[key] = (digest, compressed)
+            self._cache_bytes += len(compressed)
+            while (
+                len(self._cache) > self.config["COMPRESS_CACHE_SIZE"]
+                or self._cache_bytes > self.config["COMPRESS_CACHE_BYTES"]
+            ):
+                _, (_, evicted) = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+        return compressed
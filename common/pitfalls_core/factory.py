@@ -0,0 +1,96 @@
+import os
+
+from flask import Flask
+from sqlalchemy.pool import StaticPool
+
+from .accounts import UserMixin, db, get_current_user
+from .auth import auth
+from .compression import Compression
+from .health import Health, sqlite_probe
+from .metrics import Metrics
+from .profiler import startup
+from .ratelimit import RateLimiter
+from .templates import TemplateCache
+
+
+def create_app(import_name, config=None):
+    """
+    Flask app with the setup every challenge shares: the in-memory database
+    (one autocommitting connection for all threads), accounts, the auth
+    blueprint, metrics, response compression, the template bytecode cache,
+    rate limits and /health/deep (add probes with
+    `app.extensions["health"].probe()`). `config` overrides any of the
+    defaults.
+    """
+    startup.mark("import")
+
+    app = Flask(import_name)
+    app.secret_key = os.environ.get("SECRET_KEY", os.urandom(64))
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "poolclass": StaticPool,
+        "connect_args": {"check_same_thread": False},
+        # Every thread shares the one connection, so a transaction on it
+        # would be shared too: one request's commit or rollback would end
+        # another's, and a commit racing another thread's failed with
+        # "cannot commit - no transaction is active". Each statement commits
+        # on its own instead.
+        "isolation_level": "AUTOCOMMIT",
+    }
+    app.config["ADMIN_PASSWORD"] = os.environ.get("ADMIN_PASSWORD")
+    # Endpoint users land on after logging in
+    app.config["AUTH_HOME"] = "index"
+    # Rate limit policy per endpoint (see RateLimiter); apps add their own
+    app.config["RATELIMIT_ROUTES"] = {"auth.login": "auth", "auth.register": "auth"}
+    app.config["STARTUP_PROFILE"] = os.environ.get("STARTUP_PROFILE") == "1"
+    app.config.update(config or {})
+
+    db.init_app(app)
+    app.register_blueprint(auth)
+    Metrics(app)
+    Compression(app)
+    TemplateCache(app)
+    RateLimiter(app)
+    Health(app).probe("sqlite", sqlite_probe(app, db))
+
+    @app.context_processor
+    def inject_user():
+        return dict(current_user=get_current_user())
+
+    startup.mark("create_app")
+    return app
+
+
+def init_db(app, seed=None, **admin_fields):
+    """
+    Create the tables and the admin account, then run `seed` for the app's
+    own rows, all in one transaction.
+    """
+    with app.app_context():
+        db.create_all()
+
+        admin = UserMixin.model.new_account(
+            "admin", app.config["ADMIN_PASSWORD"], is_admin=True, **admin_fields
+        )
+        db.session.add(admin)
+        if seed:
+            seed()
+
+        db.session.commit()
+
+    startup.mark("init_db")
+
+
+def ready(app):
+    """
+    Load every template, close startup profiling and print the breakdown if
+    STARTUP_PROFILE is on.
+    """
+    startup.mark("ready")
+    app.extensions["templates"].warm()
+    startup.mark("templates")
+    app.extensions["startup"] = dict(startup.stages)
+    if app.config["STARTUP_PROFILE"]:
+        print(startup.summary(), flush=True)
+    return app
@@ -0,0 +1,178 @@
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from flask import jsonify
+
+
+class Health:
+    """
+    /health/deep: runs a probe against each dependency of the app (database,
+    Redis, the directories it writes to) and reports each one's status and
+    latency as JSON.
+
+    Probes run in parallel in a small thread pool and the whole check gives
+    up after HEALTH_PROBE_TIMEOUT seconds. Results are cached for
+    HEALTH_CACHE_TTL seconds, so polling several times a second runs every
+    probe at most once per TTL. A probe that is still stuck from an earlier
+    check is waited on again rather than started a second time.
+
+    The response is 503 if a critical probe fails. Failing non-critical
+    probes (a dependency the app can run without for a while) only turn the
+    status to "degraded".
+    """
+
+    def __init__(self, app=None):
+        self.probes = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        self._running = {}
+        self._result = None
+        self._checked_at = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "HEALTH_PROBE_TIMEOUT", float(os.environ.get("HEALTH_PROBE_TIMEOUT", 0.25))
+        )
+        app.config.setdefault(
+            "HEALTH_CACHE_TTL", float(os.environ.get("HEALTH_CACHE_TTL", 1.0))
+        )
+        self.config = app.config
+        app.extensions["health"] = self
+        app.add_url_rule("/health/deep", "health_deep", self.view)
+
+    def probe(self, name, check, critical=True):
+        """
+        Register `check`, a callable that raises if `name` is unhealthy and
+        may return a dict of details to include in the report.
+        """
+        self.probes[name] = (check, critical)
+        return self
+
+    @staticmethod
+    def _timed(check):
+        started = time.perf_counter()
+        try:
+            details = check() or {}
+        except Exception as e:
+            details = {"error": f"{type(e).__name__}: {e}"}
+        details["latency_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return details
+
+    def _run(self):
+        timeout = self.config["HEALTH_PROBE_TIMEOUT"]
+        if self._pool is None:
+            # Created on first use, so gunicorn workers never inherit it
+            self._pool = ThreadPoolExecutor(thread_name_prefix="health-probe")
+
+        for name, (check, _) in self.probes.items():
+            future = self._running.get(name)
+            if future is None or future.done():
+                self._running[name] = self._pool.submit(self._timed, check)
+
+        deadline = time.monotonic() + timeout
+        components = {}
+        for name, (_, critical) in self.probes.items():
+            try:
+                details = self._running[name].result(
+                    max(deadline - time.monotonic(), 0)
+                )
+            except TimeoutError:
+                details = {
+                    "error": f"timed out after {timeout}s",
+                    "latency_ms": timeout * 1000,
+                }
+            components[name] = {
+                "ok": "error" not in details,
+                "critical": critical,
+                **details,
+            }
+
+        if any(c["critical"] and not c["ok"] for c in components.values()):
+            status = "failing"
+        elif all(c["ok"] for c in components.values()):
+            status = "ok"
+        else:
+            status = "degraded"
+        return {"status": status, "components": components}
+
+    def check(self):
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._result is None
+                or now - self._checked_at >= self.config["HEALTH_CACHE_TTL"]
+            ):
+                self._result = self._run()
+                self._checked_at = now = time.monotonic()
+            return dict(self._result, age_ms=round((now - self._checked_at) * 1000))
+
+    def view(self):
+        result = self.check()
+        return jsonify(result), 503 if result["status"] == "failing" else 200
+
+
+def sqlite_probe(app, db):
+    """
+    Runs a query over the connection the app's requests use, through
+    db.session exactly as a request does. Like a request's session it
+    returns the shared connection with a reset (a rollback), which finds
+    nothing to undo because create_app's engine autocommits. A raw
+    db.engine.connect() here used to roll back other requests' writes.
+    """
+    from sqlalchemy import text
+
+    def check():
+        with app.app_context():
+            tables = db.session.execute(
+                text("SELECT count(*) FROM sqlite_master WHERE type = 'table'")
+            ).scalar()
+        if not tables:
+            raise RuntimeError("database has no tables")
+        return {"tables": tables}
+
+    return check
+
+
+def redis_probe(url, timeout=1.0):
+    """PINGs Redis over one connection kept for the probe."""
+    client = None
+
+    def check():
+        nonlocal client
+        if client is None:
+            from redis import Redis
+
+            client = Redis.from_url(
+                url, socket_connect_timeout=timeout, socket_timeout=timeout
+            )
+        client.ping()
+
+    return check
+
+
+def filesystem_probe(directory):
+    """Writes, syncs, reads back and removes a small file in `directory`."""
+
+    def check():
+        path = os.path.join(directory, f".health-{uuid.uuid4().hex}")
+        payload = os.urandom(16)
+        try:
+            with open(path, "wb") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            with open(path, "rb") as f:
+                if f.read() != payload:
+                    raise RuntimeError("read back different data")
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+        return {"free_mb": shutil.disk_usage(directory).free // 2**20}
+
+    return check
@@ -0,0 +1,245 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from blinker import Namespace
+from flask import (
+    Response,
+    before_render_template,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+
+from .ratelimit import rate_limit_checked
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+_signals = Namespace()
+# Sent by app code with operation and seconds as keyword arguments to time
+# a step of a request, such as a call to an outside service
+operation_timed = _signals.signal("operation-timed")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values):
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self.values = defaultdict(float)
+
+    def inc(self, key, amount=1.0):
+        self.values[key] += amount
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self.values.items()):
+            yield f"{self.name}{_labels(self.labels, key)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # key -> [count per bucket (last is +Inf), sum]
+        self.values = {}
+
+    def observe(self, key, value):
+        entry = self.values.get(key)
+        if entry is None:
+            entry = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def expose(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                labels = _labels(self.labels + ("le",), key + (bound,))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, key)} {total:g}"
+            yield f"{self.name}_count{_labels(self.labels, key)} {cumulative}"
+
+
+class Metrics:
+    """
+    Per-route request metrics in the Prometheus text format on /metrics.
+
+    Records request latency and response size per endpoint, the number and
+    duration of SQL statements each endpoint runs, the render time of each
+    template, the decisions of the rate limiter and the duration of the
+    operations the app reports through the operation_timed signal.
+
+    Turned on by the METRICS_ENABLED config, which defaults to the
+    environment variable METRICS_ENABLED=1. While it is off nothing is
+    hooked into the app and /metrics does not exist.
+
+    Every process keeps its own numbers, so with several gunicorn workers a
+    scrape sees only the worker that answered it. The series themselves
+    carry no pid label; the pid label of process_info says which worker
+    that was.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.requests = Counter(
+            "http_requests_total",
+            "Requests answered.",
+            ("endpoint", "method", "status"),
+        )
+        self.latency = Histogram(
+            "http_request_duration_seconds",
+            "Time from the start of the request to the response.",
+            ("endpoint", "method"),
+            LATENCY_BUCKETS,
+        )
+        self.size = Histogram(
+            "http_response_size_bytes",
+            "Response body size, where known up front.",
+            ("endpoint",),
+            SIZE_BUCKETS,
+        )
+        self.queries = Counter(
+            "db_queries_total", "SQL statements executed.", ("endpoint",)
+        )
+        self.query_time = Counter(
+            "db_query_seconds_total", "Time spent in SQL statements.", ("endpoint",)
+        )
+        self.render_time = Histogram(
+            "template_render_seconds",
+            "Time spent rendering a template.",
+            ("template",),
+            LATENCY_BUCKETS,
+        )
+        self.rate_limits = Counter(
+            "rate_limit_checks_total",
+            "Rate limit checks, by whether the request was let through.",
+            ("policy", "scope", "decision"),
+        )
+        self.operation_time = Histogram(
+            "operation_duration_seconds",
+            "Time spent in an operation the app timed, such as a remote call.",
+            ("operation", "endpoint"),
+            LATENCY_BUCKETS,
+        )
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "METRICS_ENABLED", os.environ.get("METRICS_ENABLED") == "1"
+        )
+        if not app.config["METRICS_ENABLED"]:
+            return
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        rate_limit_checked.connect(self._rate_limit_checked, app)
+        operation_timed.connect(self._operation_timed, app)
+        # Only apps that already use SQLAlchemy get query metrics
+        if "sqlalchemy" in sys.modules:
+            from sqlalchemy import event
+            from sqlalchemy.engine import Engine
+
+            event.listen(Engine, "before_cursor_execute", self._before_query)
+            event.listen(Engine, "after_cursor_execute", self._after_query)
+        app.add_url_rule("/metrics", "metrics", self.expose)
+
+    @staticmethod
+    def _endpoint():
+        # Queries outside a request (seeding, background threads) count as "none"
+        if has_request_context():
+            return request.endpoint or "none"
+        return "none"
+
+    def _before_request(self):
+        g._metrics_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop("_metrics_started", None)
+        if started is None or request.endpoint == "metrics":
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = self._endpoint()
+        size = response.content_length
+        with self._lock:
+            self.requests.inc((endpoint, request.method, response.status_code))
+            self.latency.observe((endpoint, request.method), elapsed)
+            if size is not None:
+                self.size.observe((endpoint,), size)
+        return response
+
+    def _before_render(self, app, template, context, **extra):
+        g.setdefault("_metrics_renders", []).append(time.perf_counter())
+
+    def _after_render(self, app, template, context, **extra):
+        renders = g.get("_metrics_renders")
+        if not renders:
+            return
+        elapsed = time.perf_counter() - renders.pop()
+        with self._lock:
+            self.render_time.observe((template.name or "string",), elapsed)
+
+    def _rate_limit_checked(self, app, policy, scope, allowed):
+        with self._lock:
+            self.rate_limits.inc((policy, scope, "allowed" if allowed else "limited"))
+
+    def _operation_timed(self, app, operation, seconds):
+        with self._lock:
+            self.operation_time.observe((operation, self._endpoint()), seconds)
+
+    # The execution context is per statement, unlike the connection, which
+    # StaticPool shares between threads
+    def _before_query(self, conn, cursor, statement, parameters, context, many):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    def _after_query(self, conn, cursor, statement, parameters, context, many):
+        started = getattr(context, "_metrics_started", None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = self._endpoint()
+        with self._lock:
+            self.queries.inc((endpoint,))
+            self.query_time.inc((endpoint,), elapsed)
+
+    def expose(self):
+        with self._lock:
+            lines = [
+                "# HELP process_info The process that answered this scrape.",
+                "# TYPE process_info gauge",
+                f'process_info{{pid="{os.getpid()}"}} 1',
+            ]
+            for metric in (
+                self.requests,
+                self.latency,
+                self.size,
+                self.queries,
+                self.query_time,
+                self.render_time,
+                self.rate_limits,
+                self.operation_time,
+            ):
+                lines.extend(metric.expose())
+        return Response(
+            "\n".join(lines) + "\n",
+            content_type="text/plain; version=0.0.4; charset=utf-8",
+        )
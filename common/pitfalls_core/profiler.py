@@ -0,0 +1,48 @@
+import os
+import resource
+import time
+
+
+def process_age():
+    """Seconds since this process was started (or forked), if /proc is there."""
+    try:
+        with open("/proc/self/stat") as f:
+            started = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    return max(uptime - started / os.sysconf("SC_CLK_TCK"), 0.0)
+
+
+class StartupProfiler:
+    """
+    Wall-clock time spent in each startup stage of the process.
+
+    The clock starts when pitfalls_core is imported; time before that is
+    reported as "interpreter". Each mark() closes the stage that is running.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        age = process_age()
+        if age is not None:
+            self.stages["interpreter"] = age
+        self._last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def summary(self):
+        # ru_maxrss is in KiB on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        stages = ", ".join(
+            f"{name} {t * 1000:.0f}ms" for name, t in self.stages.items()
+        )
+        total = sum(self.stages.values()) * 1000
+        return f"startup: {stages}, total {total:.0f}ms, peak rss {peak_rss:.1f}MB"
+
+
+startup = StartupProfiler()
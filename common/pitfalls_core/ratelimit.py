@@ -0,0 +1,268 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from blinker import Namespace
+from flask import current_app, request, session
+from werkzeug.exceptions import TooManyRequests
+
+_signals = Namespace()
+# Sent for every bucket a request is checked against, with policy, scope
+# and allowed as keyword arguments
+rate_limit_checked = _signals.signal("rate-limit-checked")
+
+SAFE_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# policy -> {scope: (burst, seconds)}: a bucket holds `burst` requests and
+# refills completely in `seconds`
+DEFAULT_POLICIES = {
+    "auth": {"ip": (20, 60)},
+    "write": {"ip": (120, 60), "user": (30, 30)},
+}
+
+
+class SharedMemoryBuckets:
+    """
+    Token buckets in a memory-mapped file, so every worker on the host
+    draws from the same ones. A key hashes to one of `slots` fixed slots
+    (key hash, tokens, last update); when two keys land in the same slot
+    the newer one starts over with a full bucket, except within one check,
+    where they share the slot as a single bucket. A check locks only the
+    slots of its own buckets: a lock per slot keeps out the other threads
+    of this worker and a lockf() range on the slot the other workers.
+    """
+
+    SLOT = struct.Struct("<Qdd")
+
+    def __init__(self, path, slots=4096):
+        self.path, self.slots = path, slots
+        self._open_lock = threading.Lock()
+        self._slot_locks = [threading.Lock() for _ in range(slots)]
+        self._map = None
+        self._pid = None
+
+    def _open(self):
+        with self._open_lock:
+            # Opened on first use, so gunicorn workers never inherit it
+            if self._pid == os.getpid():
+                return
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            size = self.SLOT.size * self.slots
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._fd, self._map = fd, mmap.mmap(fd, size)
+            self._pid = os.getpid()
+
+    def _owner(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    @contextmanager
+    def _locked(self, slots):
+        # Always taken in slot order, so two checks cannot deadlock
+        with ExitStack() as stack:
+            for slot in slots:
+                stack.enter_context(self._slot_locks[slot])
+                offset = slot * self.SLOT.size
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, self.SLOT.size, offset)
+                stack.callback(
+                    fcntl.lockf, self._fd, fcntl.LOCK_UN, self.SLOT.size, offset
+                )
+            yield
+
+    def take(self, buckets):
+        """
+        Take a token from each (key, burst, rate) bucket, or from none of
+        them if any is empty; returns (allowed, retry_after) per bucket.
+        """
+        if self._pid != os.getpid():
+            self._open()
+        owners = [self._owner(key) for key, _, _ in buckets]
+        # slot -> (owner, burst, rate). Buckets of this check that land in
+        # the same slot share it, under the first one's key and the tighter
+        # limits, so the slot is charged once and neither resets the other
+        shared = {}
+        for owner, (_, burst, rate) in zip(owners, buckets):
+            slot = owner % self.slots
+            first, shared_burst, shared_rate = shared.get(slot, (owner, burst, rate))
+            shared[slot] = (first, min(burst, shared_burst), min(rate, shared_rate))
+        with self._locked(sorted(shared)):
+            now = time.time()
+            tokens = {}
+            for slot, (owner, burst, rate) in shared.items():
+                stored, left, updated = self.SLOT.unpack_from(
+                    self._map, slot * self.SLOT.size
+                )
+                if stored != owner:
+                    left, updated = burst, now
+                tokens[slot] = min(burst, left + max(now - updated, 0.0) * rate)
+            allowed = all(left >= 1 for left in tokens.values())
+            for slot, (owner, _, _) in shared.items():
+                left = tokens[slot] - 1 if allowed else tokens[slot]
+                self.SLOT.pack_into(self._map, slot * self.SLOT.size, owner, left, now)
+        results = []
+        for owner in owners:
+            left, (_, _, rate) = tokens[owner % self.slots], shared[owner % self.slots]
+            results.append((left >= 1, 0.0 if left >= 1 else (1 - left) / rate))
+        return results
+
+
+class RedisBuckets:
+    """
+    The same buckets in Redis (or anything that speaks its protocol and
+    runs Lua), one hash per key, all of a check's buckets updated
+    atomically by one script. While Redis is unreachable every request is
+    allowed.
+    """
+
+    SCRIPT = """
+local now, tokens, allowed = tonumber(ARGV[1]), {}, 1
+for i, key in ipairs(KEYS) do
+    local burst, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    local bucket = redis.call("HMGET", key, "tokens", "updated")
+    local left = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens[i] = math.min(burst, left + math.max(now - updated, 0) * rate)
+    if tokens[i] < 1 then
+        allowed = 0
+    end
+end
+local result = {}
+for i, key in ipairs(KEYS) do
+    local burst, rate = tonumber(ARGV[2 * i]), tonumber(ARGV[2 * i + 1])
+    result[i] = tostring(tokens[i])
+    local left = tostring(tokens[i] - allowed)
+    redis.call("HSET", key, "tokens", left, "updated", tostring(now))
+    redis.call("EXPIRE", key, math.ceil(burst / rate) + 1)
+end
+return result
+"""
+
+    def __init__(self, url, timeout=0.5):
+        from redis import Redis, RedisError
+
+        self._error = RedisError
+        client = Redis.from_url(
+            url, socket_connect_timeout=timeout, socket_timeout=timeout
+        )
+        self._script = client.register_script(self.SCRIPT)
+
+    def take(self, buckets):
+        args = [time.time()]
+        for _, burst, rate in buckets:
+            args += [burst, rate]
+        try:
+            tokens = self._script(
+                keys=[f"ratelimit:{key}" for key, _, _ in buckets], args=args
+            )
+        except self._error:
+            return [(True, 0.0)] * len(buckets)
+        return [
+            (left >= 1, 0.0 if left >= 1 else (1 - left) / rate)
+            for left, (_, _, rate) in zip(map(float, tokens), buckets)
+        ]
+
+
+class RateLimiter:
+    """
+    Per-IP and per-user token buckets in front of the routes listed in
+    RATELIMIT_ROUTES (endpoint -> policy name). RATELIMIT_POLICIES gives
+    each policy its buckets as {scope: (burst, seconds)}; the scopes are
+    "ip" (the client address) and "user" (the logged-in user, skipped for
+    anonymous requests). Only requests that change something are counted,
+    GETs of the same routes are not.
+
+    The client address is the peer of the connection. Behind a reverse
+    proxy that is the proxy, so every client would share one bucket: set
+    RATELIMIT_TRUSTED_PROXIES to the number of proxies in front of the app
+    and the address they appended to X-Forwarded-For is used instead, the
+    way werkzeug's ProxyFix(x_for=...) reads it. Addresses further left
+    in the header come from the client and are never trusted.
+
+    A request over any of its limits gets 429 with Retry-After, and takes
+    no token from any of its buckets. Buckets
+    live in RATELIMIT_STORAGE: a redis:// URL, or else the path of a
+    memory-mapped file that the workers on this host share
+    (.ratelimit.mmap next to the app by default). Every check is sent as
+    the rate_limit_checked signal, which Metrics counts.
+
+    Set RATELIMIT_ENABLED=0 to turn it off.
+    """
+
+    def __init__(self, app=None):
+        self.storage = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "RATELIMIT_ENABLED", os.environ.get("RATELIMIT_ENABLED", "1") == "1"
+        )
+        app.config.setdefault(
+            "RATELIMIT_STORAGE",
+            os.environ.get(
+                "RATELIMIT_STORAGE", os.path.join(app.root_path, ".ratelimit.mmap")
+            ),
+        )
+        app.config.setdefault(
+            "RATELIMIT_TRUSTED_PROXIES",
+            int(os.environ.get("RATELIMIT_TRUSTED_PROXIES", "0")),
+        )
+        app.config.setdefault("RATELIMIT_POLICIES", DEFAULT_POLICIES)
+        app.config.setdefault("RATELIMIT_ROUTES", {})
+        if not app.config["RATELIMIT_ENABLED"]:
+            return
+
+        storage = app.config["RATELIMIT_STORAGE"]
+        if storage.startswith(("redis://", "rediss://", "unix://")):
+            self.storage = RedisBuckets(storage)
+        else:
+            self.storage = SharedMemoryBuckets(storage)
+        self.config = app.config
+        app.extensions["ratelimit"] = self
+        app.before_request(self._before_request)
+
+    def _client_address(self):
+        trusted = self.config["RATELIMIT_TRUSTED_PROXIES"]
+        if trusted:
+            forwarded = ",".join(request.headers.getlist("X-Forwarded-For"))
+            hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+            if len(hops) >= trusted:
+                return hops[-trusted]
+        return request.remote_addr
+
+    def _identity(self, scope):
+        if scope == "ip":
+            return self._client_address()
+        if scope == "user":
+            return session.get("user_id")
+        raise ValueError(f"unknown rate limit scope {scope!r}")
+
+    def _before_request(self):
+        policy = self.config["RATELIMIT_ROUTES"].get(request.endpoint)
+        if policy is None or request.method in SAFE_METHODS:
+            return
+
+        scopes, buckets = [], []
+        policies = self.config["RATELIMIT_POLICIES"]
+        for scope, (burst, seconds) in policies[policy].items():
+            identity = self._identity(scope)
+            if identity is not None:
+                scopes.append(scope)
+                buckets.append((f"{policy}:{scope}:{identity}", burst, burst / seconds))
+        if not buckets:
+            return
+
+        app = current_app._get_current_object()
+        results = self.storage.take(buckets)
+        for scope, (allowed, _) in zip(scopes, results):
+            rate_limit_checked.send(app, policy=policy, scope=scope, allowed=allowed)
+        refused = [retry_after for allowed, retry_after in results if not allowed]
+        if refused:
+            raise TooManyRequests(retry_after=math.ceil(max(refused)))
@@ -0,0 +1,135 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class ReportQueue:
+    """
+    Hands admin-bot jobs to RQ without blocking the request.
+
+    enqueue() only appends the job to a local write-ahead log. A background
+    thread drains the log into Redis over a pooled connection, reconnecting
+    with backoff while Redis is unreachable. Each job leaves the log as soon
+    as RQ has accepted it, so a drain that fails part way sends none of the
+    delivered jobs again, and reports queued during a Redis outage or
+    restart are delivered when it comes back (at least once: a crash between
+    handing a job to RQ and removing it sends it twice).
+
+    A line that is not a job (one cut short by a crash while it was being
+    appended) is moved to `<path>.rejected` instead of holding up the jobs
+    behind it. The log is shared by every server worker; one drains at a
+    time.
+    """
+
+    def __init__(self, path, redis_url, queue_name="default"):
+        self.path = path
+        self.redis_url = redis_url
+        self.queue_name = queue_name
+        self._queue = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="report-queue", daemon=True
+                )
+                self._thread.start()
+
+    @contextmanager
+    def _locked(self):
+        # The log is shared by every thread and every server worker
+        with self._lock, open(self.path + ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def enqueue(self, func, *args):
+        record = json.dumps({"func": func, "args": args}).encode() + b"\n"
+        with self._locked():
+            with open(self.path, "ab+") as f:
+                # End a line a crash left unfinished, so this job is not
+                # glued onto it
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        record = b"\n" + record
+                f.write(record)
+        self.start()
+        self._wake.set()
+
+    def _connect(self):
+        from redis import BlockingConnectionPool, Redis
+        from rq import Queue
+
+        pool = BlockingConnectionPool.from_url(
+            self.redis_url,
+            max_connections=4,
+            socket_connect_timeout=2,
+            socket_timeout=5,
+            health_check_interval=30,
+        )
+        return Queue(self.queue_name, connection=Redis(connection_pool=pool))
+
+    @staticmethod
+    def _parse(line):
+        job = json.loads(line)
+        if not (
+            isinstance(job, dict)
+            and isinstance(job.get("func"), str)
+            and isinstance(job.get("args"), list)
+        ):
+            raise ValueError("not a job")
+        return job
+
+    def _first(self):
+        with self._locked():
+            try:
+                with open(self.path, "rb") as f:
+                    return f.readline()
+            except FileNotFoundError:
+                return b""
+
+    def _remove_first(self, line):
+        # Other threads only ever append, so the first line is still `line`
+        with self._locked():
+            with open(self.path, "rb") as f:
+                remaining = f.read()[len(line) :]
+            with open(self.path + ".tmp", "wb") as f:
+                f.write(remaining)
+            os.replace(self.path + ".tmp", self.path)
+
+    def _drain(self):
+        # Held while jobs are handed to RQ, so no two workers send the same one
+        with open(self.path + ".drain", "w") as drain_lock:
+            fcntl.flock(drain_lock, fcntl.LOCK_EX)
+            while line := self._first():
+                try:
+                    job = self._parse(line)
+                except ValueError:
+                    print(f"Report queue: moving unreadable line aside: {line!r}")
+                    with open(self.path + ".rejected", "ab") as f:
+                        f.write(line if line.endswith(b"\n") else line + b"\n")
+                else:
+                    if self._queue is None:
+                        self._queue = self._connect()
+                    self._queue.enqueue(job["func"], *job["args"])
+                self._remove_first(line)
+
+    def _run(self):
+        delay = 0.5
+        while True:
+            try:
+                self._drain()
+                delay = 0.5
+                self._wake.wait(timeout=10)
+                self._wake.clear()
+            except Exception as e:
+                print(f"Report queue: Redis unavailable, retrying in {delay}s: {e}")
+                self._queue = None
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
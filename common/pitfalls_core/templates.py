@@ -0,0 +1,120 @@
+"""
+Jinja bytecode cache shared by the workers of an app, and the build step
+that fills it:
+
+    uv run python -m pitfalls_core.templates app:app
+
+compiles every template of the app in `app.py` into TEMPLATE_CACHE_DIR
+and prints how long a worker takes to load them with and without it.
+"""
+
+import os
+import sys
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class _BytecodeCache(FileSystemBytecodeCache):
+    """Counts loads that found current bytecode; a failed write is not an error."""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.hits = self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+    def dump_bytecode(self, bucket):
+        # A read-only image still renders, it only compiles in every worker
+        try:
+            super().dump_bytecode(bucket)
+        except OSError:
+            pass
+
+
+class TemplateCache:
+    """
+    Stores the compiled Python code of the app's templates in
+    TEMPLATE_CACHE_DIR (env TEMPLATE_CACHE_DIR, .jinja-cache next to the
+    app by default), so a worker loads what the image build or an earlier
+    worker compiled instead of compiling every template again. An entry is
+    only used while the template source and the Python version match.
+
+    warm() loads every template up front, so the first request to each page
+    does not pay for it; the time it took is in `warmup`.
+    """
+
+    def __init__(self, app=None):
+        self.bytecode_cache = None
+        self.warmup = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault(
+            "TEMPLATE_CACHE_DIR",
+            os.environ.get(
+                "TEMPLATE_CACHE_DIR", os.path.join(app.root_path, ".jinja-cache")
+            ),
+        )
+        self.env = app.jinja_env
+        app.extensions["templates"] = self
+        try:
+            os.makedirs(app.config["TEMPLATE_CACHE_DIR"], exist_ok=True)
+        except OSError:
+            return
+        self.bytecode_cache = _BytecodeCache(app.config["TEMPLATE_CACHE_DIR"])
+        self.env.bytecode_cache = self.bytecode_cache
+
+    def warm(self):
+        """Load every template into the environment; returns the timings."""
+        cache = self.bytecode_cache
+        hits = cache.hits if cache else 0
+        started = time.perf_counter()
+        names = self.env.list_templates()
+        for name in names:
+            self.env.get_template(name)
+        self.warmup = {
+            "templates": len(names),
+            "from_cache": (cache.hits - hits) if cache else 0,
+            "ms": (time.perf_counter() - started) * 1000,
+        }
+        return self.warmup
+
+
+def precompile(app):
+    """
+    Compile every template of `app` into its bytecode cache. Returns the
+    warm-up timings of a worker without the cache and with it.
+    """
+    templates = app.extensions.get("templates") or TemplateCache(app)
+    if templates.bytecode_cache is None:
+        raise RuntimeError(f"cannot create {app.config['TEMPLATE_CACHE_DIR']}")
+    templates.bytecode_cache.clear()
+
+    timings = {}
+    for label in ("compiled", "cached"):
+        templates.env.cache.clear()
+        timings[label] = templates.warm()
+    return timings
+
+
+def main():
+    target = sys.argv[1] if len(sys.argv) > 1 else "app:app"
+    module, _, attr = target.partition(":")
+    sys.path.insert(0, os.getcwd())
+    app = getattr(__import__(module), attr or "app")
+    for label, timing in precompile(app).items():
+        print(
+            f"{label}: {timing['templates']} templates in {timing['ms']:.1f}ms"
+            f" ({timing['from_cache']} from the bytecode cache)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import pytest
+from flask import Flask, flash
+
+from pitfalls_core.caching import conditional
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.config["CACHE_CONTROL"] = {"page": "private, no-cache"}
+    renders = []
+
+    def render():
+        renders.append(1)
+        return "page"
+
+    @app.route("/page")
+    def page():
+        return conditional("v1", render)
+
+    @app.route("/other")
+    def other():
+        return conditional("v1", render)
+
+    @app.route("/missing")
+    def missing():
+        return conditional(None, lambda: ("Note not found", 404))
+
+    @app.route("/flash")
+    def add_flash():
+        flash("saved")
+        return "ok"
+
+    client = app.test_client()
+    client.renders = renders
+    return client
+
+
+def test_renders_with_validators(client):
+    response = client.get("/page")
+
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"v1"'
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert response.headers["Vary"] == "Cookie"
+    assert client.get("/other").headers["Cache-Control"] == "no-cache"
+
+
+@pytest.mark.parametrize("if_none_match", ['"v1"', 'W/"v1"', '"v0", W/"v1"', "*"])
+def test_held_etag_is_not_modified(client, if_none_match):
+    response = client.get("/page", headers={"If-None-Match": if_none_match})
+
+    assert response.status_code == 304
+    assert response.headers["ETag"] == '"v1"'
+    assert client.renders == []
+
+
+def test_other_etag_renders(client):
+    response = client.get("/page", headers={"If-None-Match": '"v0"'})
+
+    assert response.status_code == 200
+    assert client.renders == [1]
+
+
+def test_pending_flash_forces_a_render(client):
+    client.get("/flash")
+
+    response = client.get("/page", headers={"If-None-Match": '"v1"'})
+    assert response.status_code == 200
+
+
+def test_without_etag_the_render_goes_out_as_is(client):
+    response = client.get("/missing", headers={"If-None-Match": "*"})
+
+    assert response.status_code == 404
+    assert "ETag" not in response.headers
+    assert "Cache-Control" not in response.headers
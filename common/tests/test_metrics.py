@@ -0,0 +1,40 @@
+import pytest
+from flask import Flask
+
+from pitfalls_core.metrics import Metrics, operation_timed
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["METRICS_ENABLED"] = True
+    Metrics(app)
+
+    @app.route("/verify")
+    def verify():
+        operation_timed.send(app, operation="captcha", seconds=0.2)
+        return "ok"
+
+    return app
+
+
+def test_timed_operation_is_a_histogram_per_endpoint(app):
+    client = app.test_client()
+    client.get("/verify")
+    client.get("/verify")
+
+    lines = client.get("/metrics").text.splitlines()
+    labels = 'operation="captcha",endpoint="verify"'
+    assert f'operation_duration_seconds_bucket{{{labels},le="0.1"}} 0' in lines
+    assert f'operation_duration_seconds_bucket{{{labels},le="0.25"}} 2' in lines
+    assert f"operation_duration_seconds_count{{{labels}}} 2" in lines
+
+
+def test_other_apps_do_not_record(app):
+    other = Flask("other")
+    with other.test_request_context():
+        operation_timed.send(other, operation="captcha", seconds=0.2)
+
+    assert (
+        "operation_duration_seconds_count" not in app.test_client().get("/metrics").text
+    )
@@ -0,0 +1,143 @@
+import os
+import threading
+
+import pytest
+from flask import Flask, session
+
+from pitfalls_core.ratelimit import RateLimiter, SharedMemoryBuckets
+
+
+@pytest.fixture
+def buckets(tmp_path):
+    return SharedMemoryBuckets(str(tmp_path / "ratelimit.mmap"), slots=64)
+
+
+def test_bucket_allows_burst_then_refuses(buckets):
+    results = [buckets.take([("k", 3, 0.001)])[0] for _ in range(4)]
+
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    assert results[-1][1] > 0
+
+
+def test_refused_check_takes_no_token_from_other_buckets(buckets):
+    buckets.take([("user", 1, 0.001)])
+
+    # "ip" has room, "user" does not: the request is refused as a whole
+    results = buckets.take([("ip", 1, 0.001), ("user", 1, 0.001)])
+    assert [allowed for allowed, _ in results] == [True, False]
+    # ...and the ip token it did not use is still there
+    assert buckets.take([("ip", 1, 0.001)]) == [(True, 0.0)]
+
+
+def test_threads_never_take_more_than_the_burst(buckets):
+    allowed = []
+
+    def hammer():
+        for _ in range(50):
+            allowed.append(buckets.take([("shared", 100, 0.001)])[0][0])
+
+    threads = [threading.Thread(target=hammer) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert allowed.count(True) == 100
+
+
+@pytest.mark.parametrize("order", [1, -1], ids=["ip-first", "user-first"])
+def test_keys_sharing_a_slot_are_charged_once(tmp_path, order):
+    # With one slot every key collides
+    buckets = SharedMemoryBuckets(str(tmp_path / "ratelimit.mmap"), slots=1)
+    check = [("ip", 3, 0.001), ("user", 2, 0.001)][::order]
+
+    results = [buckets.take(check) for _ in range(3)]
+
+    # Neither bucket resets the other: the pair is held to the tighter burst
+    assert [[allowed for allowed, _ in result] for result in results] == [
+        [True, True],
+        [True, True],
+        [False, False],
+    ]
+    assert results[-1][0][1] > 0
+
+
+def test_workers_share_buckets(buckets):
+    buckets.take([("k", 2, 0.001)])
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if buckets.take([("k", 2, 0.001)])[0][0] else 1)
+    _, status = os.waitpid(pid, 0)
+
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert buckets.take([("k", 2, 0.001)])[0][0] is False
+
+
+def make_app(tmp_path, **config):
+    app = Flask(__name__)
+    app.secret_key = "test"
+    app.config.update(
+        RATELIMIT_ENABLED=True,
+        RATELIMIT_STORAGE=str(tmp_path / "ratelimit.mmap"),
+        RATELIMIT_POLICIES={"write": {"ip": (3, 60), "user": (1, 60)}},
+        RATELIMIT_ROUTES={"create": "write"},
+        **config,
+    )
+    RateLimiter(app)
+
+    @app.route("/create", methods=["GET", "POST"])
+    def create():
+        return "ok"
+
+    @app.post("/login/<int:user_id>")
+    def login(user_id):
+        session["user_id"] = user_id
+        return "ok"
+
+    return app
+
+
+def test_limited_route_answers_429_with_retry_after(tmp_path):
+    client = make_app(tmp_path).test_client()
+
+    statuses = [client.post("/create").status_code for _ in range(4)]
+    assert statuses == [200, 200, 200, 429]
+    assert int(client.post("/create").headers["Retry-After"]) >= 1
+    # Reads are not counted
+    assert client.get("/create").status_code == 200
+
+
+def test_user_refusal_keeps_ip_tokens(tmp_path):
+    client = make_app(tmp_path).test_client()
+    client.post("/login/1")
+
+    assert client.post("/create").status_code == 200
+    assert client.post("/create").status_code == 429
+    assert client.post("/create").status_code == 429
+    # The refused requests did not drain the shared ip bucket
+    client.post("/login/2")
+    assert client.post("/create").status_code == 200
+    client.post("/login/3")
+    assert client.post("/create").status_code == 200
+
+
+def test_forwarded_for_ignored_without_trusted_proxies(tmp_path):
+    client = make_app(tmp_path).test_client()
+
+    for n in range(3):
+        headers = {"X-Forwarded-For": f"10.0.0.{n}"}
+        assert client.post("/create", headers=headers).status_code == 200
+    headers = {"X-Forwarded-For": "10.0.0.9"}
+    assert client.post("/create", headers=headers).status_code == 429
+
+
+def test_trusted_proxy_address_is_used(tmp_path):
+    client = make_app(tmp_path, RATELIMIT_TRUSTED_PROXIES=1).test_client()
+
+    # The client forged the first entry; the proxy appended the last one
+    forwarded = {"X-Forwarded-For": "6.6.6.6, 10.0.0.1"}
+    for _ in range(3):
+        assert client.post("/create", headers=forwarded).status_code == 200
+    assert client.post("/create", headers=forwarded).status_code == 429
+    forwarded = {"X-Forwarded-For": "6.6.6.6, 10.0.0.2"}
+    assert client.post("/create", headers=forwarded).status_code == 200
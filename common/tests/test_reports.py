@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from pitfalls_core.reports import ReportQueue
+
+
+class FakeQueue:
+    """Stands in for rq.Queue; fails on the jobs listed in `fail_on`."""
+
+    def __init__(self, fail_on=()):
+        self.jobs = []
+        self.fail_on = set(fail_on)
+
+    def enqueue(self, func, *args):
+        if args[0] in self.fail_on:
+            raise ConnectionError("Redis went away")
+        self.jobs.append((func, *args))
+
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    queue = ReportQueue(str(tmp_path / "report_queue.log"), "redis://unused")
+    # No background thread: the tests drain by hand
+    monkeypatch.setattr(queue, "start", lambda: None)
+    return queue
+
+
+def log_lines(queue):
+    with open(queue.path) as f:
+        return f.read().splitlines()
+
+
+def test_enqueue_appends_one_json_line_per_job(queue):
+    queue.enqueue("handler.visit", "http://web/post/1")
+    queue.enqueue("handler.visit", "http://web/post/2")
+
+    assert [json.loads(line) for line in log_lines(queue)] == [
+        {"func": "handler.visit", "args": ["http://web/post/1"]},
+        {"func": "handler.visit", "args": ["http://web/post/2"]},
+    ]
+
+
+def test_drain_delivers_in_order_and_empties_the_log(queue):
+    for i in range(3):
+        queue.enqueue("handler.visit", f"/post/{i}")
+    queue._queue = FakeQueue()
+
+    queue._drain()
+
+    assert queue._queue.jobs == [("handler.visit", f"/post/{i}") for i in range(3)]
+    assert log_lines(queue) == []
+
+
+def test_failed_drain_keeps_only_undelivered_jobs(queue):
+    for i in range(3):
+        queue.enqueue("handler.visit", f"/post/{i}")
+    delivered = queue._queue = FakeQueue(fail_on={"/post/1"})
+
+    with pytest.raises(ConnectionError):
+        queue._drain()
+    assert len(log_lines(queue)) == 2
+
+    queue._queue = FakeQueue()
+    queue._drain()
+
+    assert delivered.jobs == [("handler.visit", "/post/0")]
+    assert queue._queue.jobs == [
+        ("handler.visit", "/post/1"),
+        ("handler.visit", "/post/2"),
+    ]
+
+
+def test_unreadable_line_is_moved_aside(queue):
+    with open(queue.path, "w") as f:
+        f.write('{"func": "handler.vis\n')
+        f.write("[1, 2]\n")
+    queue.enqueue("handler.visit", "/post/1")
+    queue._queue = FakeQueue()
+
+    queue._drain()
+
+    assert queue._queue.jobs == [("handler.visit", "/post/1")]
+    assert log_lines(queue) == []
+    with open(queue.path + ".rejected") as f:
+        assert f.read().splitlines() == ['{"func": "handler.vis', "[1, 2]"]
+
+
+def test_job_after_a_cut_short_line_gets_its_own_line(queue):
+    # What a crash in the middle of an append leaves behind
+    with open(queue.path, "w") as f:
+        f.write('{"func": "handler.visit", "ar')
+    queue.enqueue("handler.visit", "/post/2")
+    queue._queue = FakeQueue()
+
+    queue._drain()
+
+    assert queue._queue.jobs == [("handler.visit", "/post/2")]
+    with open(queue.path + ".rejected") as f:
+        assert f.read() == '{"func": "handler.visit", "ar\n'
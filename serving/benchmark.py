@@ -0,0 +1,522 @@
+"""
+Load benchmark of the challenge apps with a realistic mix of requests.
+
+Each app is started locally under gunicorn (one at a time, so runs do not
+compete for the CPU) and driven by a number of virtual users over httpx.
+Every user has its own session and, once set up (an account, a course),
+loops over the app's scenario, picking actions by weight:
+
+    01  list notes, read a note, create a note
+    02  browse the catalogue, open a course, log in to one's own course
+    03  read the timeline, open a post, write a post
+    04  view one's space, update it
+    05  convert YAML, view the history, import a .yaml.xz
+
+Throughput, p50/p99 latency and errors are reported per action and per
+app, along with the resident memory of the app (gunicorn master and
+workers) sampled over the run. The JSON report is stable and rounded, so
+two of them diff cleanly, and --compare prints the change from an earlier
+one:
+
+    python serving/benchmark.py --json before.json
+    python serving/benchmark.py --json after.json --compare before.json
+    python serving/benchmark.py -a 03 05 -u 32 -d 30
+
+The apps are served the way gunicorn.conf.py reads the environment, so
+WEB_WORKER_CLASS, WEB_WORKERS and the rest apply here too (loadtest.py
+compares those modes on plain GETs). The rate limiter is turned off unless
+--rate-limit is given, as every user shares one address. Run it with an
+interpreter that has the apps' dependencies, gunicorn and httpx installed.
+"""
+
+import argparse
+import asyncio
+import collections
+import contextlib
+import json
+import lzma
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from regression import ROOT, App
+
+POST_ID_RE = re.compile(r"/post/(\d+)")
+PASSWORD_RE = re.compile(r"Your password is: (\w+)")
+SEEDED_COURSES = ("NMAI057", "NTIN060", "NTIN061", "NAIL025", "NSWI205")
+SAMPLE_YAML = "\n".join(
+    f"- {{name: item{i}, tags: [x, y], nested: {{value: {i}}}}}" for i in range(20)
+)
+SAMPLE_IMPORT = lzma.compress(SAMPLE_YAML.encode())
+
+
+class ScenarioError(Exception):
+    """An action that cannot be made from what the app has shown so far."""
+
+
+async def register(client, user):
+    account = {"username": f"bench{user.index}", "password": "benchmark"}
+    await client.post("/register", data=account)
+    await client.post("/login", data=account)
+
+
+# ------------------------------------------------------------
+# Scenarios: a setup run once per user, then weighted actions
+# ------------------------------------------------------------
+
+
+async def notes_setup(client, user):
+    # The first request hands out the session that holds the user's notes
+    await client.get("/")
+
+
+async def notes_create(client, user):
+    # A user cycles through 20 titles, so the listing stops growing
+    title = f"bench_{user.index}_{user.rng.randrange(20)}"
+    return await client.post(
+        "/create", data={"title": title, "author": "bench", "content": SAMPLE_YAML}
+    )
+
+
+async def courses_setup(client, user):
+    user.course = f"BEN{user.index:04d}"
+    await client.post(
+        "/create",
+        data={
+            "code": user.course,
+            "name": "Benchmark course",
+            "sylabus": "Load testing",
+            "private_note": "Nothing to see",
+        },
+    )
+    # The password is flashed on the page the creation redirects to
+    user.password = PASSWORD_RE.search((await client.get("/")).text).group(1)
+
+
+async def courses_login(client, user):
+    return await client.post(f"/login/{user.course}", data={"password": user.password})
+
+
+async def timeline_setup(client, user):
+    await register(client, user)
+    await timeline_post(client, user)
+    await timeline_read(client, user)
+
+
+async def timeline_read(client, user):
+    response = await client.get("/")
+    user.post_ids = POST_ID_RE.findall(response.text) or user.post_ids
+    return response
+
+
+async def timeline_open(client, user):
+    if not user.post_ids:
+        # Look again (which also yields to the other users) before giving up
+        await timeline_read(client, user)
+    if not user.post_ids:
+        raise ScenarioError("no post on the timeline to open")
+    return await client.get(f"/post/{user.rng.choice(user.post_ids)}")
+
+
+async def timeline_post(client, user):
+    return await client.post(
+        "/post/create", data={"content": f"Post {user.rng.random()} from bench"}
+    )
+
+
+async def space_update(client, user):
+    return await client.post(
+        "/space/update",
+        data={"content": f"<p>{SAMPLE_YAML}</p>", "h-captcha-response": "bench"},
+    )
+
+
+async def converter_import(client, user):
+    return await client.post(
+        "/import", files={"file": ("bench.yaml.xz", SAMPLE_IMPORT)}
+    )
+
+
+def get(path):
+    async def action(client, user):
+        return await client.get(path)
+
+    return action
+
+
+# app -> (setup, [(action, weight, request)])
+SCENARIOS = {
+    "01": (
+        notes_setup,
+        [
+            ("list", 6, get("/")),
+            ("read", 3, get("/note/My_Family_Tea_Recipe.txt")),
+            ("create", 1, notes_create),
+        ],
+    ),
+    "02": (
+        courses_setup,
+        [
+            ("browse", 5, get("/")),
+            (
+                "course",
+                4,
+                lambda client, user: client.get(
+                    f"/course/{user.rng.choice(SEEDED_COURSES)}"
+                ),
+            ),
+            ("login", 1, courses_login),
+        ],
+    ),
+    "03": (
+        timeline_setup,
+        [
+            ("timeline", 6, timeline_read),
+            ("post", 3, timeline_open),
+            ("write", 1, timeline_post),
+        ],
+    ),
+    "04": (
+        register,
+        [
+            ("view", 7, get("/space")),
+            ("update", 3, space_update),
+        ],
+    ),
+    "05": (
+        register,
+        [
+            (
+                "convert",
+                5,
+                lambda client, user: client.post(
+                    "/convert", data={"yaml_input": SAMPLE_YAML}
+                ),
+            ),
+            ("history", 4, get("/history")),
+            ("import", 1, converter_import),
+        ],
+    ),
+}
+
+
+# ------------------------------------------------------------
+# Measurement
+# ------------------------------------------------------------
+
+
+class User:
+    """One virtual user: its own cookies, random stream and per-action state."""
+
+    def __init__(self, index, seed):
+        self.index = index
+        self.rng = random.Random(seed * 1000 + index)
+        self.post_ids = []
+
+
+class Recorder:
+    """Latencies and errors of the measured window, plus a count for the timeline."""
+
+    def __init__(self):
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.Counter()
+        # "status 500", "ReadTimeout", ... -> count
+        self.failures = collections.Counter()
+        self.completed = 0
+        self.measuring = False
+
+    def record(self, action, seconds, failure=None):
+        self.completed += 1
+        if not self.measuring:
+            return
+        if failure is None:
+            self.latencies[action].append(seconds)
+        else:
+            self.errors[action] += 1
+            self.failures[failure] += 1
+
+
+def group_rss_mb(pgid):
+    """Resident memory of every process in the group (the app's master and workers)."""
+    total = 0
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                # Fields after the command, which may itself hold spaces
+                fields = f.read().rpartition(")")[2].split()
+            if int(fields[2]) != pgid:
+                continue
+            with open(f"/proc/{pid}/statm") as f:
+                total += int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def summarize(latencies, errors, duration):
+    summary = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / duration,
+    }
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        summary.update(p50_ms=cuts[49] * 1000, p99_ms=cuts[98] * 1000)
+    return summary
+
+
+async def drive(client, user, actions, recorder, stop):
+    names = [name for name, _, _ in actions]
+    weights = [weight for _, weight, _ in actions]
+    requests = {name: request for name, _, request in actions}
+    while not stop.is_set():
+        name = user.rng.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            response = await requests[name](client, user)
+        except httpx.HTTPError as e:
+            failure = type(e).__name__
+        except ScenarioError as e:
+            failure = str(e)
+            # Nothing may have been sent, so let the other users have a turn
+            await asyncio.sleep(0)
+        else:
+            failure = None
+            if response.status_code >= 400:
+                failure = f"status {response.status_code}"
+        recorder.record(name, time.perf_counter() - started, failure)
+
+
+async def benchmark(app, args):
+    """
+    Set every user up, warm up, then measure for args.duration seconds;
+    returns the app's report.
+    """
+    setup, actions = SCENARIOS[app.name]
+    recorder = Recorder()
+    stop = asyncio.Event()
+    users = [User(i, args.seed) for i in range(args.users)]
+
+    async with contextlib.AsyncExitStack() as stack:
+        clients = [
+            await stack.enter_async_context(
+                httpx.AsyncClient(base_url=app.url, timeout=30)
+            )
+            for _ in users
+        ]
+        # Accounts are hashed with argon2, so setting up is slow enough that
+        # it must not overlap the measurement
+        started = time.perf_counter()
+        await asyncio.gather(*(setup(c, user) for c, user in zip(clients, users)))
+        setup_ms = (time.perf_counter() - started) * 1000
+
+        drivers = [
+            asyncio.create_task(drive(c, user, actions, recorder, stop))
+            for c, user in zip(clients, users)
+        ]
+        timeline = []
+        try:
+            await asyncio.sleep(args.warmup)
+            recorder.measuring = True
+            started = sampled = time.perf_counter()
+            completed = recorder.completed
+            while (elapsed := time.perf_counter() - started) < args.duration:
+                await asyncio.sleep(min(args.interval, args.duration - elapsed))
+                now, done = time.perf_counter(), recorder.completed
+                timeline.append(
+                    {
+                        "t": now - started,
+                        "rps": (done - completed) / (now - sampled),
+                        "rss_mb": group_rss_mb(app.process.pid),
+                    }
+                )
+                sampled, completed = now, done
+            recorder.measuring = False
+            duration = time.perf_counter() - started
+        finally:
+            stop.set()
+            results = await asyncio.gather(*drivers, return_exceptions=True)
+
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        raise RuntimeError(f"a user failed: {type(failed[0]).__name__}: {failed[0]}")
+
+    everything = [s for latencies in recorder.latencies.values() for s in latencies]
+    rss = [sample["rss_mb"] for sample in timeline]
+    return dict(
+        summarize(everything, sum(recorder.errors.values()), duration),
+        startup_ms=app.startup_ms,
+        setup_ms=setup_ms,
+        failures=dict(recorder.failures.most_common()),
+        rss_mb={"start": rss[0], "peak": max(rss), "end": rss[-1]} if rss else {},
+        actions={
+            name: summarize(recorder.latencies[name], recorder.errors[name], duration)
+            for name, _, _ in actions
+        },
+        timeline=timeline,
+    )
+
+
+async def run(args):
+    env = {} if args.rate_limit else {"RATELIMIT_ENABLED": "0"}
+    reports = {}
+    with tempfile.TemporaryDirectory(prefix="benchmark-") as tmp:
+        for name in args.apps:
+            app = App(name, tmp, env)
+            try:
+                await app.start()
+                reports[name] = await benchmark(app, args)
+            except Exception as e:
+                reports[name] = {"error": f"{type(e).__name__}: {e}"}
+            finally:
+                await app.stop()
+            print_report(name, reports[name])
+    return reports
+
+
+# ------------------------------------------------------------
+# Reports
+# ------------------------------------------------------------
+
+
+def git_revision():
+    def git(*command):
+        return subprocess.run(
+            ["git", *command], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+
+    revision = git("rev-parse", "--short", "HEAD")
+    return (
+        f"{revision}-dirty" if revision and git("status", "--porcelain") else revision
+    )
+
+
+def rounded(value):
+    if isinstance(value, float):
+        return round(value, 2)
+    if isinstance(value, dict):
+        return {key: rounded(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [rounded(item) for item in value]
+    return value
+
+
+def print_report(name, report):
+    if "error" in report:
+        print(f"{name}: {report['error']}\n")
+        return
+    rss = report["rss_mb"]
+    print(
+        f"== {name}: {report['rps']:,.0f} req/s, {report['errors']} errors,"
+        f" RSS {rss.get('start', 0):.0f} -> {rss.get('peak', 0):.0f} MB peak"
+    )
+    for action, summary in {"all": report, **report["actions"]}.items():
+        print(
+            f"  {action:10} {summary['requests']:>8} req {summary['rps']:>9,.1f}/s"
+            f" p50 {summary.get('p50_ms', 0):>8.1f} ms"
+            f" p99 {summary.get('p99_ms', 0):>8.1f} ms {summary['errors']:>5} errors"
+        )
+    if report["failures"]:
+        print(
+            "  failures: "
+            + ", ".join(
+                f"{count} x {kind}" for kind, count in report["failures"].items()
+            )
+        )
+    print()
+
+
+def print_comparison(before, after):
+    """Change of every shared figure from `before` to `after` (both reports)."""
+    print(f"== {before['revision']} -> {after['revision']}")
+    print(f"  {'':14} {'':8} {'before':>10} {'after':>10} {'change':>8}")
+
+    def row(label, metric, old, new):
+        if old is None or new is None:
+            return
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+        print(f"  {label:14} {metric:8} {old:>10,.1f} {new:>10,.1f} {change:>8}")
+
+    for name, new in after["apps"].items():
+        old = before["apps"].get(name)
+        if not old or "error" in old or "error" in new:
+            continue
+        row(name, "rss peak", old["rss_mb"].get("peak"), new["rss_mb"].get("peak"))
+        for action, summary in {"all": new, **new["actions"]}.items():
+            previous = old if action == "all" else old["actions"].get(action, {})
+            for metric in ("rps", "p50_ms", "p99_ms"):
+                row(
+                    f"{name} {action}",
+                    metric,
+                    previous.get(metric),
+                    summary.get(metric),
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-a", "--apps", nargs="+", default=list(SCENARIOS), choices=SCENARIOS
+    )
+    parser.add_argument("-u", "--users", type=int, default=16, help="virtual users")
+    parser.add_argument(
+        "-d", "--duration", type=float, default=20.0, help="seconds measured per app"
+    )
+    parser.add_argument(
+        "--warmup", type=float, default=3.0, help="seconds run before measuring"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=1.0, help="seconds between timeline samples"
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--rate-limit", action="store_true", help="keep the apps' rate limiter on"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write the report here")
+    parser.add_argument(
+        "--compare", metavar="PATH", help="print the change from this earlier report"
+    )
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "settings": {
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "seed": args.seed,
+            "rate_limit": args.rate_limit,
+            "serving": {
+                key: value
+                for key, value in sorted(os.environ.items())
+                if key.startswith("WEB_")
+            },
+        },
+        "apps": asyncio.run(run(args)),
+    }
+    report = rounded(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), report)
+    if any("error" in app for app in report["apps"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
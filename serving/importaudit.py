@@ -0,0 +1,148 @@
+"""
+Import-time audit of the challenge apps.
+
+Imports each app under `python -X importtime` a few times, keeps the
+fastest run and reports what importing app.py costs: the total, the
+modules app.py imports directly (cumulative time, including everything
+they pull in) and the packages that account for the most time of their own.
+Modules that are heavy but only used by rarely hit routes are the ones to
+import lazily:
+
+    python serving/importaudit.py                  # all apps
+    python serving/importaudit.py -a 02 -n 15 -r 5
+    python serving/importaudit.py --json imports.json
+
+Importing an app runs its module-level code too (02 seeds its database
+there), which is included in the total.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPS = {
+    "00": "00",
+    "01": "01",
+    "02": "02",
+    "03": "03/src",
+    "04": "04/src",
+    "05": "05/src",
+}
+
+
+def parse_importtime(output):
+    """
+    Turn `-X importtime` output into trees of
+    {"name", "self_us", "cumulative_us", "children"}.
+
+    Lines come in post-order, children first, nested by two spaces per level.
+    """
+    pending = defaultdict(list)
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        node = {
+            "name": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "children": pending.pop(level + 1, []),
+        }
+        pending[level].append(node)
+    return pending[0]
+
+
+def walk(node):
+    yield node
+    for child in node["children"]:
+        yield from walk(child)
+
+
+def import_app(directory):
+    env = dict(os.environ, ADMIN_PASSWORD=os.environ.get("ADMIN_PASSWORD", "admin"))
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.join(ROOT, "common"), env.get("PYTHONPATH")])
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=os.path.join(ROOT, directory),
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return next(r for r in parse_importtime(result.stderr) if r["name"] == "app")
+
+
+def audit(directory, runs, top):
+    tree = min(
+        (import_app(directory) for _ in range(runs)),
+        key=lambda node: node["cumulative_us"],
+    )
+
+    packages = defaultdict(int)
+    for node in walk(tree):
+        if node is not tree:
+            packages[node["name"].split(".")[0]] += node["self_us"]
+
+    direct = sorted(tree["children"], key=lambda n: -n["cumulative_us"])
+    return {
+        "total_ms": tree["cumulative_us"] / 1000,
+        # app.py's own module-level code, outside its imports
+        "module_code_ms": tree["self_us"] / 1000,
+        "modules": sum(1 for _ in walk(tree)) - 1,
+        "direct": [
+            {"name": n["name"], "cumulative_ms": n["cumulative_us"] / 1000}
+            for n in direct[:top]
+        ],
+        "packages": [
+            {"name": name, "self_ms": us / 1000}
+            for name, us in sorted(packages.items(), key=lambda p: -p[1])[:top]
+        ],
+    }
+
+
+def print_report(app, report):
+    print(
+        f"== {app}: {report['total_ms']:.1f} ms, {report['modules']} modules,"
+        f" {report['module_code_ms']:.1f} ms in app.py itself"
+    )
+    print(f"  {'imported by app.py':32} {'cumulative ms':>14}")
+    for entry in report["direct"]:
+        print(f"  {entry['name']:32} {entry['cumulative_ms']:>14.1f}")
+    print(f"  {'package':32} {'own ms':>14}")
+    for entry in report["packages"]:
+        print(f"  {entry['name']:32} {entry['self_ms']:>14.1f}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-a", "--apps", nargs="+", default=list(APPS), choices=APPS)
+    parser.add_argument("-r", "--runs", type=int, default=3)
+    parser.add_argument("-n", "--top", type=int, default=10)
+    parser.add_argument("--json", metavar="PATH", help="also write the report here")
+    args = parser.parse_args()
+
+    reports = {}
+    for app in args.apps:
+        try:
+            reports[app] = audit(APPS[app], args.runs, args.top)
+        except RuntimeError as e:
+            print(f"== {app}: import failed: {e}\n")
+            continue
+        print_report(app, reports[app])
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
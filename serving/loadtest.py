@@ -0,0 +1,177 @@
+"""
+Load-test the challenge apps under each serving mode.
+
+Every app is started locally, once per mode, and hammered with keep-alive
+GET requests from a pool of client threads. For each run the harness
+reports requests/s and p50/p99 latency:
+
+    python serving/loadtest.py                      # all apps, all modes
+    python serving/loadtest.py -a 02 03 -m dev gthread -c 32 -d 10
+
+Run it with an interpreter that has the apps' dependencies and gunicorn
+installed.
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONF = os.path.join(ROOT, "serving", "gunicorn.conf.py")
+
+# app -> (directory holding app.py, paths requested round-robin)
+APPS = {
+    "00": ("00", ["/"]),
+    "01": ("01", ["/", "/note/My_Family_Tea_Recipe.txt"]),
+    "02": ("02", ["/", "/health"]),
+    "03": ("03/src", ["/", "/health"]),
+    "04": ("04/src", ["/", "/health"]),
+    "05": ("05/src", ["/", "/health"]),
+}
+
+# mode -> gunicorn settings (see gunicorn.conf.py); None is the dev server
+MODES = {
+    "dev": None,
+    "sync": {"WEB_WORKER_CLASS": "sync", "WEB_WORKERS": "1"},
+    "gthread": {"WEB_WORKER_CLASS": "gthread", "WEB_WORKERS": "1"},
+    "gthread-preload": {
+        "WEB_WORKER_CLASS": "gthread",
+        "WEB_WORKERS": "4",
+        "WEB_PRELOAD": "1",
+    },
+}
+
+
+def start(app, mode, port):
+    directory, _ = APPS[app]
+    env = dict(os.environ, ADMIN_PASSWORD=os.environ.get("ADMIN_PASSWORD", "admin"))
+    # pitfalls_core without requiring it to be installed
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.join(ROOT, "common"), env.get("PYTHONPATH")])
+    )
+    if MODES[mode] is None:
+        command = [sys.executable, "-m", "flask", "--app", "app:create_app()", "run"]
+        command += ["--port", str(port)]
+    else:
+        env.update(MODES[mode], WEB_BIND=f"127.0.0.1:{port}")
+        command = [sys.executable, "-m", "gunicorn", "-c", GUNICORN_CONF]
+        command.append("app:create_app()")
+    return subprocess.Popen(
+        command,
+        cwd=os.path.join(ROOT, directory),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(port, process, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/")
+            connection.getresponse().read()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def client(port, paths, stop, latencies, errors):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    # Each client is one visitor: keep the session cookie the app hands out
+    headers = {}
+    i = 0
+    while not stop.is_set():
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            cookie = response.getheader("Set-Cookie")
+            if cookie:
+                headers["Cookie"] = cookie.split(";", 1)[0]
+            if response.status >= 500:
+                errors.append(response.status)
+            else:
+                latencies.append(time.perf_counter() - started)
+            if response.will_close:
+                connection.close()
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(e)
+            connection.close()
+
+
+def measure(port, paths, concurrency, duration):
+    stop = threading.Event()
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=client, args=(port, paths, stop, latencies, errors))
+        for _ in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    if len(latencies) < 2:
+        return {"requests": len(latencies), "errors": len(errors)}
+    cuts = statistics.quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / duration,
+        "p50_ms": cuts[49] * 1000,
+        "p99_ms": cuts[98] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-a", "--apps", nargs="+", default=list(APPS), choices=APPS)
+    parser.add_argument("-m", "--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-d", "--duration", type=float, default=5.0)
+    parser.add_argument("-p", "--port", type=int, default=8081)
+    args = parser.parse_args()
+
+    print(
+        f"{'app':4} {'mode':16} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}"
+    )
+    for app in args.apps:
+        for mode in args.modes:
+            process = start(app, mode, args.port)
+            try:
+                if not wait_ready(args.port, process):
+                    print(f"{app:4} {mode:16} failed to start")
+                    continue
+                result = measure(
+                    args.port, APPS[app][1], args.concurrency, args.duration
+                )
+            finally:
+                process.terminate()
+                process.wait()
+
+            if "rps" not in result:
+                print(f"{app:4} {mode:16} no successful requests")
+                continue
+            print(
+                f"{app:4} {mode:16} {result['rps']:>9,.0f} {result['p50_ms']:>8.1f}"
+                f" {result['p99_ms']:>8.1f} {result['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
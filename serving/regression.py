@@ -0,0 +1,411 @@
+"""
+Regression pass over the exploit of every challenge.
+
+Every app is started locally under gunicorn with its own temporary state
+and fresh flags, and the exploit of each challenge (serving/exploits.py,
+the same code its solve.py runs) goes against it over httpx, all
+challenges at once. Waits are on the event itself (the socket being
+bound, the flag appearing) rather than fixed sleeps. For each
+challenge the report gives the app's startup time, the exploit's wall time
+and whether the right flag came back:
+
+    python serving/regression.py
+    python serving/regression.py -c 01-C 05 --timeout 30 --json regression.json
+
+Run it with an interpreter that has the apps' dependencies, gunicorn and
+httpx installed. The exit status is 1 if any exploit failed or was
+skipped.
+
+03 and 04 need their admin bot. Its queue is stood in for by the apps' own
+report log (REDIS_URL points nowhere, so reported jobs stay in the log) and
+its browser by any WebDriver server, logged in as admin over the W3C
+protocol:
+
+    docker run --network host selenium/standalone-firefox
+    SELENIUM_URL=http://127.0.0.1:4444 python serving/regression.py
+
+BOT_APP_HOST is the host the browser reaches the apps at (127.0.0.1).
+Without SELENIUM_URL, or without rq installed (the apps then turn reports
+off), 03 and 04 cannot be solved and are reported as skipped, which fails
+the run. Leave them out with -c, or pass --allow-skips to let a run that
+solved everything else pass.
+"""
+
+import argparse
+import asyncio
+import collections
+import importlib.util
+import json
+import os
+import secrets
+import signal
+import socket
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import httpx
+
+from exploits import (
+    FLAG_RE,
+    solve_00,
+    solve_01_availability,
+    solve_01_confidentiality,
+    solve_01_integrity,
+    solve_02,
+    solve_03,
+    solve_04,
+    solve_05,
+    until,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONF = os.path.join(ROOT, "serving", "gunicorn.conf.py")
+# W3C WebDriver key of an element reference
+WEB_ELEMENT = "element-6066-11e4-a52a-4944a4419bc8"
+
+# app -> (directory holding app.py, flag variables its exploits recover)
+APPS = {
+    "00": ("00", ("FLAG",)),
+    "01": ("01", ("FLAG_C", "FLAG_A", "FLAG_I")),
+    "02": ("02", ("FLAG",)),
+    "03": ("03/src", ("FLAG",)),
+    "04": ("04/src", ("FLAG",)),
+    "05": ("05/src", ("FLAG",)),
+}
+BOT_APPS = {"03", "04"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class App:
+    """One challenge app under gunicorn, with its state in a temporary directory."""
+
+    def __init__(self, name, tmp, env=None):
+        self.name = name
+        self.directory = os.path.join(ROOT, APPS[name][0])
+        self.tmp = os.path.join(tmp, name)
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.admin_password = secrets.token_hex(8)
+        self.flags = {
+            var: f"pitfalls{{regression-{name}-{var.lower()}-{secrets.token_hex(4)}}}"
+            for var in APPS[name][1]
+        }
+        self.report_log = os.path.join(self.tmp, "report_queue.log")
+        self.log = collections.deque(maxlen=20)
+        self.env = env or {}
+        self.process = None
+        self.startup_ms = None
+
+    def _prepare(self):
+        os.makedirs(self.tmp)
+        if self.name != "01":
+            return self.directory
+        # 01 reads notes/ and writes sessions/ in its working directory, and
+        # its traversal reaches confidential.txt one level above it (/ in
+        # the image)
+        cwd = os.path.join(self.tmp, "app")
+        os.makedirs(cwd)
+        os.symlink(os.path.join(self.directory, "notes"), os.path.join(cwd, "notes"))
+        with open(os.path.join(self.directory, "confidential.txt")) as f:
+            confidential = f.read().replace("pitfalls{fake_flag}", self.flags["FLAG_C"])
+        with open(os.path.join(self.tmp, "confidential.txt"), "w") as f:
+            f.write(confidential)
+        return cwd
+
+    async def start(self):
+        started = time.perf_counter()
+        cwd = self._prepare()
+        bot_host = os.environ.get("BOT_APP_HOST", "127.0.0.1")
+        env = dict(
+            os.environ,
+            **self.flags,
+            PYTHONPATH=os.pathsep.join(
+                filter(
+                    None,
+                    [
+                        self.directory,
+                        os.path.join(ROOT, "common"),
+                        os.environ.get("PYTHONPATH"),
+                    ],
+                )
+            ),
+            WEB_BIND=f"127.0.0.1:{self.port}",
+            ADMIN_PASSWORD=self.admin_password,
+            DISABLE_AUTO_CLEANUP="1",
+            RATELIMIT_STORAGE=os.path.join(self.tmp, "ratelimit.mmap"),
+            GLOBAL_STATE_PATH=os.path.join(self.tmp, "global_state.mmap"),
+            REPORT_QUEUE_LOG=self.report_log,
+            # Nothing listens there, so reported jobs stay in the log
+            REDIS_URL="redis://127.0.0.1:1",
+            INTERNAL_HOST=f"http://{bot_host}:{self.port}",
+        )
+        env.update(self.env)
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "-c",
+            GUNICORN_CONF,
+            "app:create_app()",
+            cwd=cwd,
+            env=env,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            # Its own process group, so stop() can take the workers down too
+            start_new_session=True,
+        )
+
+        listening = asyncio.Event()
+
+        async def read_log():
+            async for line in self.process.stderr:
+                self.log.append(line.decode(errors="replace").rstrip())
+                if b"Listening at" in line:
+                    listening.set()
+
+        self._reader = asyncio.create_task(read_log())
+        exited = asyncio.create_task(self.process.wait())
+        bound = asyncio.create_task(listening.wait())
+        await asyncio.wait({exited, bound}, return_when=asyncio.FIRST_COMPLETED)
+        bound.cancel()
+        if exited.done():
+            raise RuntimeError(f"{self.name} exited: {self.tail()}")
+        exited.cancel()
+
+        # The socket is bound; the first request waits for the worker to boot
+        async with httpx.AsyncClient(base_url=self.url, timeout=60) as client:
+            await client.get("/")
+        self.startup_ms = (time.perf_counter() - started) * 1000
+
+    def tail(self):
+        return " | ".join(list(self.log)[-3:])
+
+    async def stop(self):
+        if self.process is None or self.process.returncode is not None:
+            return
+        # SIGINT is gunicorn's quick shutdown, but a worker still waits for
+        # its threads (05's import) before it exits
+        self.process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self.process.wait(), 2)
+        except TimeoutError:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            await self.process.wait()
+
+
+class AdminBot:
+    """
+    Stands in for the admin bot of 03 and 04 (client/handler.py, the rq
+    worker running it and its Firefox). Jobs are read straight from the
+    app's report log, and each reported URL is visited in a WebDriver
+    session logged in as admin that stays open for `stay` seconds.
+    """
+
+    def __init__(self, webdriver_url, app, stay=15):
+        self.webdriver_url = webdriver_url.rstrip("/")
+        self.app = app
+        self.stay = stay
+        self.visits = 0
+
+    async def run(self):
+        offset = 0
+        while True:
+            try:
+                with open(self.app.report_log, "rb") as f:
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                data = b""
+            # Only whole lines; a job being appended is read next time
+            complete = data[: data.rfind(b"\n") + 1]
+            offset += len(complete)
+            for line in complete.splitlines():
+                job = json.loads(line)
+                if job["func"] == "handler.visit":
+                    await self.visit(*job["args"])
+            if not complete:
+                await asyncio.sleep(0.05)
+
+    async def visit(self, url):
+        origin = "{0.scheme}://{0.netloc}".format(urllib.parse.urlsplit(url))
+        async with httpx.AsyncClient(base_url=self.webdriver_url, timeout=60) as wd:
+            response = await wd.post(
+                "/session",
+                json={
+                    "capabilities": {
+                        "alwaysMatch": {
+                            "browserName": "firefox",
+                            "moz:firefoxOptions": {"args": ["-headless"]},
+                        }
+                    }
+                },
+            )
+            response.raise_for_status()
+            session = f"/session/{response.json()['value']['sessionId']}"
+            try:
+                await wd.post(f"{session}/url", json={"url": f"{origin}/login"})
+                # Enter after the password submits the form
+                for name, text in (
+                    ("username", "admin"),
+                    ("password", self.app.admin_password + "\ue007"),
+                ):
+                    found = await wd.post(
+                        f"{session}/element",
+                        json={"using": "css selector", "value": f"[name={name}]"},
+                    )
+                    element = found.json()["value"][WEB_ELEMENT]
+                    await wd.post(
+                        f"{session}/element/{element}/value", json={"text": text}
+                    )
+
+                async def logged_in():
+                    current = (await wd.get(f"{session}/url")).json()["value"]
+                    return not current.rstrip("/").endswith("/login")
+
+                await until(logged_in, timeout=10)
+                await wd.post(f"{session}/url", json={"url": url})
+                self.visits += 1
+                await asyncio.sleep(self.stay)
+            finally:
+                await wd.delete(session)
+
+
+# challenge -> (app, flag variable, exploit)
+CHALLENGES = {
+    "00": ("00", "FLAG", solve_00),
+    "01-C": ("01", "FLAG_C", solve_01_confidentiality),
+    "01-A": ("01", "FLAG_A", solve_01_availability),
+    "01-I": ("01", "FLAG_I", solve_01_integrity),
+    "02": ("02", "FLAG", solve_02),
+    "03": ("03", "FLAG", solve_03),
+    "04": ("04", "FLAG", solve_04),
+    "05": ("05", "FLAG", solve_05),
+}
+
+
+def skip_reason(app):
+    if app not in BOT_APPS:
+        return None
+    if not os.environ.get("SELENIUM_URL"):
+        return "needs a browser: set SELENIUM_URL to a WebDriver server"
+    if importlib.util.find_spec("rq") is None:
+        return "rq is not installed, so the app does not take reports"
+    return None
+
+
+async def run_challenge(name, app, timeout):
+    _, var, exploit = CHALLENGES[name]
+    result = {"challenge": name, "startup_ms": app.startup_ms}
+    started = time.perf_counter()
+    try:
+        async with httpx.AsyncClient(
+            base_url=app.url, follow_redirects=True, timeout=30
+        ) as client:
+            page = await asyncio.wait_for(exploit(client), timeout)
+    except TimeoutError:
+        result.update(status="timeout", detail=f"no flag after {timeout}s")
+    except Exception as e:
+        result.update(status="error", detail=f"{type(e).__name__}: {e}")
+    else:
+        found = FLAG_RE.findall(page)
+        if app.flags[var] in found:
+            result.update(status="ok", detail="")
+        else:
+            result.update(
+                status="failed", detail=f"got {found[0]}" if found else "no flag"
+            )
+    result["solve_ms"] = (time.perf_counter() - started) * 1000
+    return result
+
+
+async def run(challenges, timeout):
+    results = {
+        name: {"challenge": name, "status": "skipped", "detail": reason}
+        for name in challenges
+        if (reason := skip_reason(CHALLENGES[name][0]))
+    }
+    needed = sorted({CHALLENGES[n][0] for n in challenges if n not in results})
+
+    with tempfile.TemporaryDirectory(prefix="regression-") as tmp:
+        apps = {name: App(name, tmp) for name in needed}
+        bots = []
+        try:
+            started = await asyncio.gather(
+                *(app.start() for app in apps.values()), return_exceptions=True
+            )
+            for app, error in zip(list(apps.values()), started):
+                if isinstance(error, Exception):
+                    del apps[app.name]
+                    for name in challenges:
+                        if CHALLENGES[name][0] == app.name:
+                            results[name] = {
+                                "challenge": name,
+                                "status": "error",
+                                "detail": f"did not start: {error}",
+                            }
+            for name in BOT_APPS & apps.keys():
+                bot = AdminBot(os.environ["SELENIUM_URL"], apps[name])
+                bots.append(asyncio.create_task(bot.run()))
+
+            pending = [n for n in challenges if n not in results]
+            for result in await asyncio.gather(
+                *(run_challenge(n, apps[CHALLENGES[n][0]], timeout) for n in pending)
+            ):
+                results[result["challenge"]] = result
+        finally:
+            for bot in bots:
+                bot.cancel()
+            await asyncio.gather(*bots, return_exceptions=True)
+            await asyncio.gather(*(app.stop() for app in apps.values()))
+
+    return [results[name] for name in challenges]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "-c", "--challenges", nargs="+", default=list(CHALLENGES), choices=CHALLENGES
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=60.0, help="seconds per exploit"
+    )
+    parser.add_argument("--json", metavar="PATH", help="also write the report here")
+    parser.add_argument(
+        "--allow-skips",
+        action="store_true",
+        help="exit 0 even if challenges were skipped for lack of a bot",
+    )
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = asyncio.run(run(args.challenges, args.timeout))
+    total = time.perf_counter() - started
+
+    print(f"{'challenge':10} {'result':8} {'startup ms':>10} {'solve ms':>9}  detail")
+    for result in results:
+        startup = result.get("startup_ms")
+        solve = result.get("solve_ms")
+        print(
+            f"{result['challenge']:10} {result['status']:8}"
+            f" {'' if startup is None else f'{startup:,.0f}':>10}"
+            f" {'' if solve is None else f'{solve:,.0f}':>9}  {result['detail']}"
+        )
+    print(f"total {total:.1f}s")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"total_s": total, "results": results}, f, indent=2)
+    passing = ("ok", "skipped") if args.allow_skips else ("ok",)
+    if any(r["status"] not in passing for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()